@@ -30,6 +30,11 @@
 def classFactory(iface):
     """
     Appellé par QGIS, renvoie une instance du plugin.
+    Le temps de chargement est mesuré dès ici (voir `FCReportGeneratorPlugin.log_startup`).
     """
+    import time
+    started = time.perf_counter()
     from .plugin import FCReportGeneratorPlugin
-    return FCReportGeneratorPlugin(iface)
+    plugin = FCReportGeneratorPlugin(iface)
+    plugin.startup_started = started
+    return plugin
@@ -1,20 +1,107 @@
 from .imports import *
 import json
 from pathlib import Path
+from types import MappingProxyType
+
+class ConfigSnapshot:
+    """
+    Configuration résolue et figée d'un mode (FC/DC) et d'une technologie.
+
+    Construite une seule fois par `Config.snapshot` : les valeurs dépendant du mode
+    sont déjà choisies, le motif de la couche des zones est compilé et la table des
+    noms de thèmes est prête. Immuable, elle peut être partagée entre threads et
+    transmise telle quelle aux traitements.
+    """
+
+    __slots__ = (
+        'mode', 'tech_code', 'technology', 'analyse_type', 'word_title',
+        'id_field', 'restri_id', 'label_field', 'type_restri_strict',
+        'kml_source_fields', 'kml_feasible_fields', 'theme_display',
+        'layers', 'area_layer_pattern',
+    )
+
+    # Clés obligatoires de la configuration d'une technologie
+    LAYER_KEYS = ('global_area_layer', 'feasible_layer', 'conditional_layer',
+                  'restriction_layer', 'restri_join_id_field', 'technology')
+
+    def __init__(self, data, mode, tech_code):
+        """
+        :param data: Contenu de param.json.
+        :param mode: FC ou DC.
+        :param tech_code: Code de la technologie (clé de `FC_CONFIG` / `DC_CONFIG`).
+        :raises ValueError: Mode ou technologie inconnus, configuration incomplète.
+        """
+        if mode not in ('FC', 'DC'):
+            raise ValueError("Mode must be 'FC' or 'DC'")
+        section = data[mode]
+        technologies = section[f'{mode}_CONFIG']
+        if tech_code not in technologies:
+            raise ValueError(f"Unknown technology '{tech_code}' for mode {mode}")
+
+        layers = technologies[tech_code]
+        missing = [key for key in self.LAYER_KEYS if key not in layers]
+        if missing:
+            raise ValueError(f"Incomplete configuration for {mode}/{tech_code}: missing {', '.join(missing)}")
+        try:
+            area_layer_pattern = re.compile(layers['global_area_layer'])
+        except re.error as e:
+            raise ValueError(f"Invalid layer pattern for {mode}/{tech_code}: {e}")
+
+        values = {
+            'mode': mode,
+            'tech_code': tech_code,
+            'technology': layers['technology'],
+            'analyse_type': section[f'{mode}_ANALYSE_TYPE'],
+            'word_title': section[f'{mode}_WORD_TITLE_TEXT'],
+            'id_field': section[f'{mode}_ID_FIELD'],
+            'restri_id': section[f'{mode}_RESTRI_ID'],
+            'label_field': section[f'{mode}_LABEL_FIELD'],
+            'type_restri_strict': section[f'{mode}_TYPE_RESTRI_STRICT'],
+            'kml_source_fields': MappingProxyType(dict(section[f'{mode}_KML_FIELDS_EXPORT_SOURCEAREA'])),
+            'kml_feasible_fields': MappingProxyType(dict(section[f'{mode}_KML_FIELDS_EXPORT_FEASIBLEAREA'])),
+            'theme_display': MappingProxyType({str(k): v for k, v in data['global']['THEME_DISPLAY'].items()}),
+            'layers': MappingProxyType(dict(layers)),
+            'area_layer_pattern': area_layer_pattern,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    def __repr__(self):
+        return f"<ConfigSnapshot {self.mode}/{self.tech_code}>"
+
+    def display_name(self, theme_value):
+        """Pour les noms de fichiers/dossiers/titres"""
+        key = str(theme_value)
+        return self.theme_display.get(key, key)
+
+    def matches_area_layer(self, layer_name):
+        """Vrai si le nom correspond au motif de la couche des zones (`global_area_layer`)."""
+        return self.area_layer_pattern.search(layer_name) is not None
+
 
 class Config:
     """Configuration centralisée du plugin Abei GIS Report Helper"""
     
     _config_path = Path(__file__).parent / 'param.json'
     _config_data = None
+    # Date de modification de param.json lors du dernier chargement
+    _config_mtime = None
+    # (mode, code technologie) -> ConfigSnapshot, vidé à chaque rechargement
+    _snapshots = {}
     CURRENT_MODE = 'FC'
 
     # Initialisation au chargement de la classe
     @classmethod
     def _load_config(cls):
         """Charge/recharge la configuration depuis le fichier JSON"""
+        mtime = os.path.getmtime(cls._config_path)
         with open(cls._config_path, 'r', encoding='utf-8') as f:
             cls._config_data = json.load(f)
+        cls._config_mtime = mtime
+        cls._snapshots = {}
     
     # Initialisation au premier accès
     @classmethod
@@ -22,6 +109,48 @@ class Config:
         if cls._config_data is None:
             cls._load_config()
 
+    @classmethod
+    def _reload_if_changed(cls):
+        """Recharge param.json s'il a été modifié depuis le dernier chargement."""
+        try:
+            mtime = os.path.getmtime(cls._config_path)
+        except OSError:
+            mtime = None
+        if cls._config_data is None or (mtime is not None and mtime != cls._config_mtime):
+            cls._load_config()
+
+    @classmethod
+    def snapshot(cls, tech_code, mode):
+        """
+        Configuration figée d'une technologie, construite une fois par mode et
+        technologie, puis reconstruite seulement si param.json change.
+
+        Le mode est toujours explicite : un traitement ne dépend pas de `CURRENT_MODE`
+        et des traitements FC et DC peuvent s'exécuter en même temps.
+
+        :param tech_code: Code de la technologie (clé de `FC_CONFIG` / `DC_CONFIG`).
+        :param mode: FC ou DC.
+        :return: `ConfigSnapshot`.
+        """
+        cls._reload_if_changed()
+        key = (mode, tech_code)
+        snapshot = cls._snapshots.get(key)
+        if snapshot is None:
+            snapshot = ConfigSnapshot(cls._config_data, *key)
+            cls._snapshots[key] = snapshot
+        return snapshot
+
+    @classmethod
+    def snapshots(cls, mode):
+        """
+        Configurations figées de toutes les technologies d'un mode.
+
+        :param mode: FC ou DC.
+        :return: Liste de `ConfigSnapshot`, dans l'ordre de param.json.
+        """
+        cls._reload_if_changed()
+        return [cls.snapshot(tech_code, mode) for tech_code in cls._config_data[mode][f'{mode}_CONFIG']]
+
     # === Version dynamique des constantes ===
     @classmethod
     @property
@@ -47,6 +176,78 @@ class Config:
         cls._ensure_loaded()
         return cls._config_data['global']['THEME_DISPLAY']
 
+    @classmethod
+    @property
+    def RENDER_WORKERS(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('RENDER_WORKERS', 4)
+
+    @classmethod
+    @property
+    def CAPTURE_PROFILE(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('CAPTURE_PROFILE', 'standard')
+
+    @classmethod
+    @property
+    def CAPTURE_PROFILES(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('CAPTURE_PROFILES', {'standard': {'dpi': 200}})
+
+    @classmethod
+    @property
+    def CAPTURE_ENCODING(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('CAPTURE_ENCODING', {})
+
+    @classmethod
+    @property
+    def RENDER_CACHE(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('RENDER_CACHE', {})
+
+    @classmethod
+    @property
+    def BASEMAP_CACHE(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('BASEMAP_CACHE', {})
+
+    @classmethod
+    @property
+    def KML_WORKERS(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('KML_WORKERS', 4)
+
+    @classmethod
+    @property
+    def KML_OUTPUT_MODE(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('KML_OUTPUT_MODE', 'directory')
+
+    @classmethod
+    @property
+    def KML_GEOMETRY(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('KML_GEOMETRY', {})
+
+    @classmethod
+    @property
+    def SINGLE_PASS_OVERLAYS(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('SINGLE_PASS_OVERLAYS', True)
+
+    @classmethod
+    @property
+    def STARTUP_BUDGET_MS(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('STARTUP_BUDGET_MS', 150)
+
+    @classmethod
+    @property
+    def PERF_TRACE(cls):
+        cls._ensure_loaded()
+        return cls._config_data['global'].get('PERF_TRACE', {})
+
     # FC Properties
     @classmethod
     @property
@@ -225,6 +426,48 @@ class Config:
     def get_kml_feasible_fields():
         return Config.FC_KML_FIELDS_EXPORT_FEASIBLEAREA if Config.CURRENT_MODE == 'FC' else Config.DC_KML_FIELDS_EXPORT_FEASIBLEAREA
 
+    @staticmethod
+    def get_capture_profile(name=None):
+        """
+        Profil de capture des images du rapport (draft, standard, print).
+
+        :param name: Nom du profil (défaut : `CAPTURE_PROFILE`).
+        :return: Dictionnaire du profil, au moins {'dpi': ...}.
+        """
+        name = name or Config.CAPTURE_PROFILE
+        profiles = Config.CAPTURE_PROFILES
+        if name not in profiles:
+            raise ValueError(f"Unknown capture profile: {name}")
+        return profiles[name]
+
+    @staticmethod
+    def get_capture_encoding(capture_type):
+        """
+        Encodage des captures d'un type (overview, theme, label) dans le document Word.
+
+        :return: Dictionnaire {'format': 'PNG' | 'PNG8' | 'JPEG', 'quality': ...}.
+        """
+        return Config.CAPTURE_ENCODING.get(capture_type, {'format': 'PNG'})
+
+    @staticmethod
+    def get_cache_options(section):
+        """
+        Options d'un cache disque (`RENDER_CACHE` ou `BASEMAP_CACHE`).
+        """
+        return Config.RENDER_CACHE if section == 'RENDER_CACHE' else Config.BASEMAP_CACHE
+
+    @staticmethod
+    def get_kml_geometry_options(export_name):
+        """
+        Simplification et précision des géométries d'un export KML
+        (source, feasible, conditional, restrictions), complétées par `default`.
+
+        :return: Tuple (tolérance de simplification en unités de la couche, nombre de décimales ou None).
+        """
+        options = dict(Config.KML_GEOMETRY.get('default', {}))
+        options.update(Config.KML_GEOMETRY.get(export_name, {}))
+        return options.get('simplify_tolerance', 0) or 0, options.get('precision')
+
     @staticmethod
     def get_config(tech_code):
         return Config.FC_CONFIG[tech_code] if Config.CURRENT_MODE == 'FC' else Config.DC_CONFIG[tech_code]
@@ -0,0 +1,165 @@
+from ..imports import *
+from .layer_manager import LayerManager
+from .jobs import JobCanceledError, run_report_job, run_kml_job
+from .tasks import AnalysisTask
+from .tracing import Tracer
+
+import csv
+import time
+
+# Résultat d'un job du lot, pour le tableau récapitulatif
+BatchResult = namedtuple('BatchResult', ['analysis_id', 'analysis_label', 'kind', 'status', 'seconds', 'message'])
+
+
+def collect_analyses(layer, settings, source, value=None):
+    """
+    Liste les analyses à traiter dans la couche des zones.
+
+    :param layer: Couche des zones d'analyse.
+    :param settings: `ConfigSnapshot` de la technologie (champs id et label).
+    :param source: 'selection' (entités sélectionnées), 'ids' (liste d'identifiants)
+                   ou 'expression' (expression de filtre QGIS).
+    :param value: Liste d'identifiants séparés par des virgules/espaces, ou expression.
+    :return: Liste de tuples (analysis_id, analysis_label), triée par identifiant.
+    """
+    id_field = settings.id_field
+    label_field = settings.label_field
+
+    if source == 'selection':
+        features = layer.selectedFeatures()
+    elif source == 'ids':
+        ids = [v for v in re.split(r'[\s,;]+', value or '') if v]
+        if not ids:
+            raise ValueError("No analysis ID given")
+        id_list = ", ".join(f"'{v}'" for v in ids)
+        features = layer.getFeatures(QgsFeatureRequest().setFilterExpression(f'"{id_field}" IN ({id_list})'))
+    elif source == 'expression':
+        if not value:
+            raise ValueError("No filter expression given")
+        features = layer.getFeatures(QgsFeatureRequest().setFilterExpression(value))
+    else:
+        raise ValueError(f"Unknown batch source: {source}")
+
+    analyses = {}
+    for f in features:
+        analysis_id = f[id_field]
+        if analysis_id is None:
+            continue
+        has_label = label_field in f.fields().names() and f[label_field]
+        analyses[analysis_id] = f[label_field] if has_label else f"id_{analysis_id}"
+
+    if not analyses:
+        raise ValueError("No analysis matches the batch selection")
+    return sorted(analyses.items(), key=lambda item: str(item[0]))
+
+
+class BatchTask(AnalysisTask):
+    """
+    File de jobs (rapport Word et/ou KML) pour plusieurs analyses d'une même technologie.
+
+    Les couches résolues et la configuration sont partagées entre tous les jobs du lot.
+    Les fonds rendus ne le sont pas : leur emprise est propre à chaque analyse, ils sont
+    libérés avec elle (le fond de carte reste réutilisable via son cache disque).
+    """
+
+    def __init__(self, layer, settings, analyses, output_dir, report=True, kml=True):
+        """
+        :param settings: `ConfigSnapshot` de la technologie, commun à tout le lot.
+        """
+        super().__init__(f"[Abei GIS] Batch - {len(analyses)} analyses")
+        self.layer = layer
+        self.settings = settings
+        self.analyses = analyses
+        self.output_dir = output_dir
+        self.report = report
+        self.kml = kml
+        self.results = []
+        self.summary_path = None
+        # Couches, sources et styles résolus dans le thread principal, lus ensuite par les jobs
+        self._layers = LayerManager.resolve_layers(settings.layers, layer)
+        if report:
+            LayerManager.enable_all_rules(self._layers['restriction'])
+            LayerManager.capture_styles(self._layers)
+        self._snapshot = None
+        self._analysis_tracer = None
+
+    def _execute(self):
+        kinds = [kind for kind, enabled in (("report", self.report), ("kml", self.kml)) if enabled]
+        total = len(self.analyses) * len(kinds)
+        done = 0
+
+        for analysis_id, analysis_label in self.analyses:
+            # Restrictions lues par le rapport, réutilisées par le KML de la même analyse
+            self._snapshot = None
+            # Une trace par analyse, écrite à côté de son dernier résultat
+            self._analysis_tracer = Tracer(f"{analysis_label} (id {analysis_id})")
+            last_path = None
+            for kind in kinds:
+                if self.isCanceled():
+                    self.results.append(BatchResult(analysis_id, analysis_label, kind, "canceled", 0.0, ""))
+                    continue
+
+                done += 1
+                self.stageChanged.emit(f"Batch {done}/{total} - {kind} {analysis_label}")
+                self.setProgress(100.0 * (done - 1) / total)
+
+                start = time.perf_counter()
+                try:
+                    path = self._run_job(kind, analysis_id, analysis_label)
+                    status, message = "success", path
+                    last_path = path
+                except JobCanceledError:
+                    status, message = "canceled", ""
+                except Exception as e:
+                    status, message = "failed", str(e)
+                    QgsMessageLog.logMessage(f"Batch {kind} failed for {analysis_label}: {str(e)}", "ABEI GIS", Qgis.Warning)
+
+                self.results.append(BatchResult(analysis_id, analysis_label, kind, status,
+                                                time.perf_counter() - start, message))
+
+            self._analysis_tracer.finish(last_path)
+
+        self.summary_path = self._write_summary()
+        return self.output_dir
+
+    def _run_job(self, kind, analysis_id, analysis_label):
+        if kind == "kml":
+            return run_kml_job(self._layers, self.settings, analysis_id, analysis_label, self.output_dir,
+                               feedback=self, snapshot=self._snapshot, tracer=self._analysis_tracer)
+
+        layer_manager = LayerManager(
+            layer_name=self.layer.name(),
+            analysis_id=analysis_id,
+            analysis_label=analysis_label,
+            settings=self.settings,
+            layers=self._layers,
+            tracer=self._analysis_tracer
+        )
+        try:
+            layer_manager.setup_layers()
+            return run_report_job(layer_manager, self.output_dir, feedback=self)
+        finally:
+            self._snapshot = layer_manager.restriction_snapshot
+            layer_manager.cleanup()
+
+    def set_stage(self, message, done=None, total=None):
+        """
+        Les étapes internes d'un job ne remplacent pas la progression du lot :
+        elles sont seulement relayées au libellé de statut.
+        """
+        if done is not None and total:
+            message = f"{message} {done}/{total}"
+        self.stageChanged.emit(message)
+
+    def _write_summary(self):
+        """
+        Écrit le tableau récapitulatif du lot (CSV) dans le répertoire de sortie.
+        """
+        current_datetime = QDateTime.currentDateTime().toString("dd-MM-yyyy_hh'h'mm")
+        summary_path = os.path.join(self.output_dir, f"[Vmap-Batch]{current_datetime}.csv")
+        with open(summary_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(["id", "label", "output", "status", "seconds", "message"])
+            for r in self.results:
+                writer.writerow([r.analysis_id, r.analysis_label, r.kind, r.status, f"{r.seconds:.1f}", r.message])
+        return summary_path
@@ -1,53 +1,540 @@
 from ..imports import *
 from ..config import Config
+from .layer_filters import LayerFilterProvider
+from .overlay_renderer import MultiTargetOverlayRenderer
+from .render_cache import RenderCache
+from .main_thread import run_in_main_thread
+
+import time
+
+# Une capture à produire : étendue + filtre des restrictions (None = aucun filtre supplémentaire)
+# + entités de restriction correspondantes, si déjà connues (rendu en une passe)
+# + largeur affichée dans le document, en pouces (None = `DEFAULT_WIDTH`)
+CaptureRequest = namedtuple('CaptureRequest', ['extent', 'subset', 'features', 'width'], defaults=[None, None])
+
+class _PreparedRender:
+    """
+    Rendu d'une capture dans une QImage, préparé dans le thread principal.
+
+    Comme `QgsMapRendererTask` : le job et les moteurs de rendu des couches sont créés
+    par `prepare()` dans le thread principal (lecture des couches), puis `render()`
+    dessine depuis n'importe quel thread.
+    """
+
+    def __init__(self, map_settings, filter_provider):
+        """
+        :param filter_provider: Fournisseur de filtres du rendu, gardé référencé jusqu'à la fin.
+        """
+        self.filter_provider = filter_provider
+        self.canceled = False
+        self.image = QImage(map_settings.outputSize(), map_settings.outputImageFormat())
+        dots_per_meter = int(map_settings.outputDpi() / 0.0254)
+        self.image.setDotsPerMeterX(dots_per_meter)
+        self.image.setDotsPerMeterY(dots_per_meter)
+        self.image.fill(Qt.transparent)
+
+        self.painter = QPainter(self.image)
+        self.job = QgsMapRendererCustomPainterJob(map_settings, self.painter)
+        self.job.prepare()
+
+    def render(self):
+        """
+        Dessine la capture et retourne la QImage.
+        """
+        try:
+            if not self.canceled:
+                self.job.renderPrepared()
+        finally:
+            self.painter.end()
+        return self.image
+
+    def cancel(self):
+        self.canceled = True
+        self.job.cancelWithoutBlocking()
 
 class ImageExporter:
-    """Gère les opérations d'exportation d'image."""
+    """
+    Gère les opérations d'exportation d'image.
 
-    def __init__(self, layer_manager):
+    Utilisable depuis une tâche de fond : les couches ne sont lues que dans le thread
+    principal (préparation des rendus) ou via l'état relevé par `LayerManager.resolve_layers`.
+    """
+
+    # Largeur affichée par défaut d'une capture dans le document (pouces)
+    DEFAULT_WIDTH = 3.5
+    # Version de la composition des captures, incluse dans les clés du cache disque :
+    # à incrémenter quand une même clé produirait une autre image
+    COMPOSITE_VERSION = 2
+
+    def __init__(self, layer_manager, compositing=True, base_cache=None, profile=None, render_cache=False):
         """
         Initialisation de l'exportateur d'images.
 
         :param layer_manager: Instance de `LayerManager` pour accéder aux couches de la carte.
+        :param compositing: Si True, le fond (basemap + zones) est rendu une seule fois
+                            puis seules les restrictions sont rendues et superposées.
+        :param base_cache: Dictionnaire de fonds déjà rendus pour cette analyse, repris de la
+                           préparation anticipée (optionnel).
+        :param profile: Profil de capture (draft, standard, print) ; défaut : `CAPTURE_PROFILE`.
+        :param render_cache: `RenderCache` disque (None pour le désactiver) ; défaut : celui de param.json.
         """
         self.layer_manager = layer_manager
+        self.tracer = layer_manager.tracer
         self.width, self.height = self.layer_manager.analysis_extent.width(), self.layer_manager.analysis_extent.height()
         self.margin_x, self.margin_y = self.width * 0.1, self.height * 0.1
+        self.compositing = compositing
+        self._base_images = base_cache if base_cache is not None else {}
+        self.dpi = Config.get_capture_profile(profile)['dpi']
+        self.render_cache = RenderCache.from_config() if render_cache is False else render_cache
+        self._feature_digests = {}
+        self._base_version = None
+        # Fond de carte résolu avec les couches de l'analyse, avec son cache disque
+        self.basemap_layer = layer_manager.layers['basemap']
+        self.basemap_cache = RenderCache.from_config('BASEMAP_CACHE')
 
-    def export_image(self, extent, output_path, subset=None):
+    def _capture_rect(self, extent):
         """
-        Exporte une image de la carte dans un fichier.
-
-        :param extent: Étendue géographique à capturer sous forme de `QgsRectangle`.
-        :param output_path: Chemin de sortie pour enregistrer l'image au format PNG.
-        :param subset: Expression de filtre pour restreindre les entités visibles (optionnel).
+        Retourne l'emprise de capture : l'étendue demandée élargie de la marge de 10%.
         """
-        if subset:
-            self.layer_manager.restriction_layer.setSubsetString(subset)
-
-        rect = QgsRectangle(
+        return QgsRectangle(
             extent.xMinimum() - self.margin_x,
             extent.yMinimum() - self.margin_y,
             extent.xMaximum() + self.margin_x,
             extent.yMaximum() + self.margin_y
         )
 
-        map_settings = QgsMapSettings()
-        visible_layers = [
-            self.layer_manager.restriction_layer,
+    def _output_size(self, rect, width=None):
+        """
+        Taille de rendu : largeur affichée dans le document x DPI du profil,
+        hauteur selon les proportions de l'emprise (aucun pixel perdu en bordure).
+
+        :param width: Largeur affichée, en pouces (défaut : `DEFAULT_WIDTH`).
+        """
+        width_px = max(1, round((width or self.DEFAULT_WIDTH) * self.dpi))
+        ratio = rect.height() / rect.width() if rect.width() > 0 else 1.0
+        return QSize(width_px, max(1, round(width_px * ratio)))
+
+    def _base_layers(self):
+        """
+        Couches statiques de la capture (tout sauf les restrictions), de haut en bas.
+        """
+        return self._zone_layers() + ([self.basemap_layer] if self.basemap_layer else [])
+
+    def _zone_layers(self):
+        """
+        Couches vectorielles du fond : zone d'analyse, zones conditionnelle et faisable.
+        """
+        layers = [
             self.layer_manager.area_layer,
             self.layer_manager.conditional_layer if self.layer_manager.conditional_layer else None,
             self.layer_manager.feasible_layer if self.layer_manager.feasible_layer else None,
-            QgsProject.instance().mapLayersByName(Config.BASEMAP)[0]
         ]
-        visible_layers = [l for l in visible_layers if l is not None]
-        map_settings.setLayers(visible_layers)
-        map_settings.setOutputSize(QSize(800, 600))
+        return [l for l in layers if l is not None]
+
+    def _map_settings(self, rect, layers, transparent=False, restriction_filter=None, width=None):
+        """
+        Prépare les paramètres de rendu pour une liste de couches sur l'emprise donnée.
+
+        Les filtres de l'analyse (et celui des restrictions) sont appliqués via un
+        `LayerFilterProvider` propre à ce rendu, sans modifier les couches du projet.
+
+        :param transparent: Fond transparent (pour les calques superposés).
+        :param restriction_filter: Expression de filtre de la couche des restrictions (optionnel).
+        :param width: Largeur affichée de la capture, en pouces (voir `_output_size`).
+        :return: Tuple (QgsMapSettings, LayerFilterProvider) ; le fournisseur doit
+                 rester référencé jusqu'à la fin du rendu.
+        """
+        filters = dict(self.layer_manager.layer_filters)
+        if restriction_filter:
+            filters[self.layer_manager.restriction_layer.id()] = restriction_filter
+        filter_provider = LayerFilterProvider(filters)
+
+        map_settings = QgsMapSettings()
+        map_settings.setLayers(layers)
+        map_settings.setOutputSize(self._output_size(rect, width))
+        map_settings.setOutputDpi(self.dpi)
         map_settings.setExtent(rect)
+        map_settings.setFeatureFilterProvider(filter_provider)
+        # La sélection de l'utilisateur ne doit pas apparaître sur les captures
+        map_settings.setFlag(QgsMapSettings.DrawSelection, False)
+        if transparent:
+            map_settings.setBackgroundColor(QColor(0, 0, 0, 0))
+        return map_settings, filter_provider
+
+    def _style(self, layer):
+        """
+        État de rendu de la couche (`LayerStyle`), relevé dans le thread principal.
+        """
+        return self.layer_manager.layers['styles'][layer.id()]
+
+    def _prepare_render(self, rect, layers, transparent=False, restriction_filter=None, width=None):
+        """
+        Prépare, dans le thread principal, le rendu d'une liste de couches sur l'emprise donnée.
+
+        :return: `_PreparedRender` à dessiner avec `render()`.
+        """
+        map_settings, filter_provider = self._map_settings(rect, layers, transparent, restriction_filter, width)
+        return run_in_main_thread(_PreparedRender, map_settings, filter_provider)
+
+    def _render(self, rect, layers, transparent=False, restriction_filter=None, width=None):
+        """
+        Rend une liste de couches sur l'emprise donnée et retourne la QImage.
+        """
+        return self._prepare_render(rect, layers, transparent, restriction_filter, width).render()
+
+    def render_basemap(self, rect, width=None):
+        """
+        Rend le fond de carte seul, relu si possible depuis la mémoire puis le cache disque.
+
+        La clé ne dépend que du SCR, de l'emprise, de la taille et de la source du fond :
+        toutes les captures d'un rapport, et les rapports suivants sur la même zone,
+        réutilisent la même image au lieu d'interroger à nouveau le serveur de tuiles.
+
+        :param rect: Emprise de capture (marge comprise).
+        :param width: Largeur affichée de la capture, en pouces (optionnel).
+        :return: QImage du fond de carte.
+        """
+        settings, _ = self._map_settings(rect, [self.basemap_layer], width=width)
+        size = settings.outputSize()
+        style = self._style(self.basemap_layer)
+        parts = {
+            'crs': [settings.destinationCrs().authid(), style.crs],
+            'rect': [rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()],
+            'size': [size.width(), size.height(), self.dpi],
+            'source': style.source,
+        }
+        key = RenderCache.make_key(parts)
+        memory_key = ('basemap', key)
+
+        if memory_key not in self._base_images:
+            with self.tracer.span("render basemap", cache_hits=0) as counts:
+                image = self.basemap_cache.get(key) if self.basemap_cache else None
+                if image is None:
+                    image = self._render(rect, [self.basemap_layer], width=width)
+                    if self.basemap_cache:
+                        self.basemap_cache.put(key, image)
+                        self.basemap_cache.evict()
+                else:
+                    counts['cache_hits'] = 1
+            self._base_images[memory_key] = image
+        return self._base_images[memory_key]
+
+    def render_base_image(self, extent, width=None):
+        """
+        Rend (une seule fois par emprise et par taille) la pile de fond : basemap,
+        zone d'analyse, zones faisable et conditionnelle.
+
+        Le fond de carte vient de `render_basemap` ; seules les zones de l'analyse
+        sont rendues, sur un calque transparent superposé.
+
+        :param extent: Étendue géographique à capturer sous forme de `QgsRectangle`.
+        :param width: Largeur affichée de la capture, en pouces (optionnel).
+        :return: QImage mise en cache pour cette emprise.
+        """
+        rect = self._capture_rect(extent)
+        size = self._output_size(rect, width)
+        key = (self.layer_manager.area_layer.id(), self.layer_manager.analysis_id,
+               rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum(),
+               size.width(), size.height(), self.dpi)
+        if key not in self._base_images:
+            if self.basemap_layer is None:
+                with self.tracer.span("render base stack"):
+                    self._base_images[key] = self._render(rect, self._zone_layers(), width=width)
+            else:
+                basemap = self.render_basemap(rect, width)
+                with self.tracer.span("render base stack"):
+                    zones = self._render(rect, self._zone_layers(), transparent=True, width=width)
+                    self._base_images[key] = self._composite(basemap, zones)
+        return self._base_images[key]
+
+    def render_image(self, extent, subset=None, width=None):
+        """
+        Rend une capture de la carte et retourne la QImage.
+
+        En mode composition, le fond mis en cache est recopié et seules les
+        restrictions filtrées sont rendues sur un calque transparent par-dessus.
+
+        :param extent: Étendue géographique à capturer sous forme de `QgsRectangle`.
+        :param subset: Expression de filtre pour restreindre les entités visibles (optionnel).
+        :param width: Largeur affichée de la capture, en pouces (optionnel).
+        """
+        rect = self._capture_rect(extent)
+
+        if not self.compositing:
+            return self._render(rect, [self.layer_manager.restriction_layer] + self._base_layers(),
+                                restriction_filter=subset, width=width)
+
+        overlay = self._render(rect, [self.layer_manager.restriction_layer], transparent=True,
+                               restriction_filter=subset, width=width)
+        return self._composite_capture(self.render_base_image(extent, width), overlay)
+
+    def _composite(self, base, overlay, opacity=None, blend_mode=None):
+        """
+        Superpose un calque sur une copie de l'image de fond.
+
+        :param opacity: Opacité appliquée au calque (optionnel).
+        :param blend_mode: Mode de fusion `QPainter.CompositionMode` (optionnel, SourceOver sinon).
+        """
+        img = QImage(base)
+        painter = QPainter(img)
+        if opacity is not None:
+            painter.setOpacity(opacity)
+        if blend_mode is not None:
+            painter.setCompositionMode(blend_mode)
+        painter.drawImage(0, 0, overlay)
+        painter.end()
+        return img
+
+    def _composite_capture(self, base, overlay, job_rendered=True):
+        """
+        Superpose le calque des restrictions d'une capture sur son fond, quel que soit
+        le chemin de rendu.
+
+        Le calque étant rendu seul sur fond transparent, le mode de fusion de la couche
+        n'a rien à quoi s'appliquer pendant le rendu : il l'est ici. L'opacité est déjà
+        appliquée par `QgsMapRendererJob`, pas par le rendu en une passe.
+
+        :param job_rendered: Calque produit par un `QgsMapRendererJob`.
+        """
+        style = self._style(self.layer_manager.restriction_layer)
+        with self.tracer.span("composite capture"):
+            return self._composite(base, overlay, opacity=None if job_rendered else style.opacity,
+                                   blend_mode=style.blend_mode)
+
+    def _single_pass_available(self, requests):
+        """
+        Le rendu en une passe demande le mode composition, les entités de chaque
+        requête, et une symbologie qu'il sait reproduire.
+        """
+        return (
+            Config.SINGLE_PASS_OVERLAYS
+            and self.compositing
+            and all(request.features is not None for request in requests)
+            and run_in_main_thread(MultiTargetOverlayRenderer.supports, self.layer_manager.restriction_layer)
+        )
+
+    def _export_images_single_pass(self, requests, on_progress=None, bounding_boxes=None):
+        """
+        Rend toutes les captures d'une même emprise en une seule lecture des restrictions.
+
+        :param bounding_boxes: Emprises précalculées des entités {fid: QgsRectangle} (optionnel).
+        """
+        images = [None] * len(requests)
+
+        # Une passe par emprise et taille distinctes (en pratique : l'aperçu et les captures du tableau)
+        by_rect = defaultdict(list)
+        for index, request in enumerate(requests):
+            rect = self._capture_rect(request.extent)
+            size = self._output_size(rect, request.width)
+            by_rect[(rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum(),
+                     size.width(), size.height())].append(index)
+
+        for indexes in by_rect.values():
+            extent, width = requests[indexes[0]].extent, requests[indexes[0]].width
+            base = self.render_base_image(extent, width)
+            settings, _ = self._map_settings(self._capture_rect(extent), [self.layer_manager.restriction_layer],
+                                             transparent=True, width=width)
+            renderer = MultiTargetOverlayRenderer(self.layer_manager.restriction_layer, settings)
+            run_in_main_thread(renderer.prepare, len(indexes))
+            with self.tracer.span("render captures (single pass)", captures=len(indexes)):
+                overlays = renderer.render([requests[i].features for i in indexes], bounding_boxes=bounding_boxes)
+
+            for index, overlay in zip(indexes, overlays):
+                images[index] = self._composite_capture(base, overlay, job_rendered=False)
+                if on_progress:
+                    on_progress()
+
+        return images
+
+    def _feature_digest(self, feature):
+        """
+        Empreinte du contenu d'une entité (géométrie et attributs).
+        """
+        digest = self._feature_digests.get(feature.id())
+        if digest is None:
+            content = hashlib.sha1(bytes(feature.geometry().asWkb()))
+            content.update(repr(feature.attributes()).encode('utf-8'))
+            digest = self._feature_digests[feature.id()] = content.hexdigest()
+        return digest
+
+    def _base_data_version(self):
+        """
+        Version des données du fond : empreinte des entités affichées des couches filtrées
+        (zone d'analyse, zones faisable et conditionnelle), calculée une fois par analyse.
+        Les entités sont lues dans les sources des couches, pas dans les couches elles-mêmes.
+        """
+        if self._base_version is None:
+            digest = hashlib.sha1()
+            layers = self.layer_manager.layers
+            sources = {layers[key].id(): layers['sources'][key]
+                       for key in ('area', 'conditional', 'feasible') if layers[key] is not None}
+            for layer_id, expression in sorted(self.layer_manager.layer_filters.items()):
+                if layer_id not in sources:
+                    continue
+                request = QgsFeatureRequest().setFilterExpression(expression)
+                for feature in sorted(sources[layer_id].getFeatures(request), key=lambda f: f.id()):
+                    digest.update(f"{layer_id}:{feature.id()}:".encode('utf-8'))
+                    digest.update(bytes(feature.geometry().asWkb()))
+                    digest.update(repr(feature.attributes()).encode('utf-8'))
+            self._base_version = digest.hexdigest()
+        return self._base_version
+
+    def cache_key(self, request):
+        """
+        Clé du cache disque d'une capture : emprise, taille, couches et styles,
+        filtres, données du fond et contenu des entités de restriction.
+
+        :return: Clé, ou None si les entités de la capture ne sont pas connues.
+        """
+        if request.features is None:
+            return None
+
+        rect = self._capture_rect(request.extent)
+        size = self._output_size(rect, request.width)
+        layers = [self.layer_manager.restriction_layer] + self._base_layers()
+        return RenderCache.make_key({
+            'rect': [rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()],
+            'size': [size.width(), size.height(), self.dpi],
+            'compositing': [self.compositing, self.COMPOSITE_VERSION],
+            'layers': [[layer.id(), self._style(layer).source, self._style(layer).digest] for layer in layers],
+            'filters': sorted(self.layer_manager.layer_filters.items()),
+            'base_data': self._base_data_version(),
+            'features': sorted([f.id(), self._feature_digest(f)] for f in request.features),
+        })
+
+    def export_images(self, requests, max_workers=None, on_progress=None, bounding_boxes=None):
+        """
+        Rend un lot de captures, en relisant celles déjà présentes dans le cache disque.
+
+        :param requests: Liste de `CaptureRequest`.
+        :param max_workers: Nombre maximal de jobs en parallèle (défaut : `Config.RENDER_WORKERS`).
+        :param on_progress: Appelé après chaque capture terminée (ou relue).
+        :param bounding_boxes: Emprises précalculées des entités (rendu en une passe uniquement).
+        :return: Liste de QImage, dans l'ordre des requêtes.
+        """
+        if self.render_cache is None:
+            return self._render_images(requests, max_workers, on_progress, bounding_boxes)
+
+        with self.tracer.span("read render cache", captures=len(requests)) as counts:
+            keys = [self.cache_key(request) for request in requests]
+            images = [self.render_cache.get(key) if key else None for key in keys]
+            counts['hits'] = sum(1 for image in images if image is not None)
+        for image in images:
+            if image is not None and on_progress:
+                on_progress()
+
+        missing = [index for index, image in enumerate(images) if image is None]
+        if missing:
+            rendered = self._render_images([requests[i] for i in missing], max_workers, on_progress, bounding_boxes)
+            with self.tracer.span("write render cache", captures=len(missing)):
+                for index, image in zip(missing, rendered):
+                    images[index] = image
+                    if keys[index]:
+                        self.render_cache.put(keys[index], image)
+                self.render_cache.evict()
+
+        return images
+
+    def _render_images(self, requests, max_workers=None, on_progress=None, bounding_boxes=None):
+        """
+        Rend un lot de captures avec plusieurs rendus simultanés.
+
+        Chaque rendu porte son propre filtre : les rendus sont indépendants et les couches
+        du projet ne sont pas modifiées. Ils sont préparés un par un dans le thread
+        principal, puis dessinés en parallèle dans un pool de threads.
+
+        Si toutes les requêtes portent leurs entités, les calques de restrictions sont
+        produits en une seule lecture (`MultiTargetOverlayRenderer`) au lieu d'un job par capture.
+
+        :param requests: Liste de `CaptureRequest`.
+        :param max_workers: Nombre maximal de jobs en parallèle (défaut : `Config.RENDER_WORKERS`).
+        :param on_progress: Appelé après chaque capture terminée ; une exception levée
+                            (annulation) interrompt les jobs encore en cours.
+        :param bounding_boxes: Emprises précalculées des entités (rendu en une passe uniquement).
+        :return: Liste de QImage, dans l'ordre des requêtes.
+        """
+        if self._single_pass_available(requests):
+            return self._export_images_single_pass(requests, on_progress, bounding_boxes)
+
+        max_workers = max(1, max_workers or Config.RENDER_WORKERS)
+        images = [None] * len(requests)
+        running = []
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        def finish_oldest():
+            index, request, _, future, started = running.pop(0)
+            img = future.result()
+            # Durée du rendu, de sa préparation à sa fin (les rendus se recouvrent)
+            self.tracer.add("render capture", started, time.perf_counter())
+            if self.compositing:
+                img = self._composite_capture(self.render_base_image(request.extent, request.width), img)
+            images[index] = img
+            if on_progress:
+                on_progress()
+
+        try:
+            for index, request in enumerate(requests):
+                if len(running) >= max_workers:
+                    finish_oldest()
+
+                rect = self._capture_rect(request.extent)
+                if self.compositing:
+                    # Le fond est rendu avant de lancer le job pour ne pas le mettre en concurrence
+                    self.render_base_image(request.extent, request.width)
+                    layers, transparent = [self.layer_manager.restriction_layer], True
+                else:
+                    layers, transparent = [self.layer_manager.restriction_layer] + self._base_layers(), False
+
+                started = time.perf_counter()
+                prepared = self._prepare_render(rect, layers, transparent=transparent,
+                                                restriction_filter=request.subset, width=request.width)
+                running.append((index, request, prepared, executor.submit(prepared.render), started))
+
+            while running:
+                finish_oldest()
+        finally:
+            for _, _, prepared, future, _ in running:
+                future.cancel()
+                prepared.cancel()
+            executor.shutdown(wait=True)
+
+        return images
+
+    @staticmethod
+    def image_digest(img):
+        """
+        Empreinte (SHA-1) des pixels d'une image, calculée avant tout encodage.
+        Deux captures identiques au pixel près ont la même empreinte.
+        """
+        bits = img.constBits()
+        bits.setsize(img.sizeInBytes() if hasattr(img, 'sizeInBytes') else img.byteCount())
+        digest = hashlib.sha1(bytes(bits))
+        digest.update(f"{img.width()}x{img.height()}:{int(img.format())}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def encode_image(img, fmt="PNG", quality=-1):
+        """
+        Encode une QImage en mémoire, sans passer par un fichier.
+
+        :param img: Image rendue.
+        :param fmt: "PNG", "PNG8" (palette de 256 couleurs), "JPEG" ou autre format Qt.
+        :param quality: Qualité JPEG (0-100) ; pour le PNG, 0 donne la compression maximale
+                        (-1 = valeur par défaut de Qt).
+        :return: Contenu encodé (`bytes`).
+        """
+        fmt = fmt.upper()
+        if fmt == "PNG8":
+            img = img.convertToFormat(QImage.Format_Indexed8, Qt.DiffuseDither)
+            fmt = "PNG"
+        elif fmt in ("JPEG", "JPG"):
+            # Pas de canal alpha en JPEG : les captures composées sont opaques
+            img = img.convertToFormat(QImage.Format_RGB32)
+            fmt = "JPEG"
 
-        render = QgsMapRendererSequentialJob(map_settings)
-        render.start()
-        render.waitForFinished()
-        img = render.renderedImage()
-        img.save(output_path, "PNG")
-        QgsMessageLog.logMessage(f"Image exported: {output_path}", Config.PLUGIN_NAME, Qgis.Info)
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        img.save(buffer, fmt, quality)
+        buffer.close()
+        return bytes(data)
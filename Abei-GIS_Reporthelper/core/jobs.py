@@ -0,0 +1,116 @@
+from ..imports import *
+from .kml_exporter import KMLEXporter
+from .kml_output import open_kml_output
+from .image_exporter import ImageExporter
+
+class JobCanceledError(Exception):
+    """Levée quand un traitement est annulé par l'utilisateur."""
+
+
+class JobFeedback:
+    """
+    Retour de progression d'un traitement.
+
+    Implémentation par défaut sans interface : ne fait rien et n'est jamais annulée.
+    Les tâches de fond (`AnalysisTask`) exposent la même interface.
+    """
+
+    def set_stage(self, message, done=None, total=None):
+        """
+        Signale l'étape en cours.
+
+        :param message: Libellé de l'étape
+        :param done: Nombre d'éléments traités (optionnel)
+        :param total: Nombre total d'éléments (optionnel)
+        """
+        pass
+
+    def check_canceled(self):
+        """Lève `JobCanceledError` si le traitement a été annulé."""
+        pass
+
+
+def run_report_job(layer_manager, output_dir, feedback=None, base_cache=None):
+    """
+    Génère le rapport Word d'une analyse dont les couches sont déjà configurées.
+
+    :param layer_manager: `LayerManager` sur lequel `setup_layers()` a été appelé.
+    :param output_dir: Répertoire de sortie du rapport.
+    :param feedback: Retour de progression (`JobFeedback` ou tâche de fond).
+    :param base_cache: Fonds déjà rendus pour cette analyse par la préparation anticipée (optionnel).
+    :return: Chemin du fichier Word généré.
+    """
+    feedback = feedback or JobFeedback()
+
+    feedback.set_stage("Fetching restrictions")
+    snapshot = layer_manager.get_restriction_snapshot()
+    feedback.check_canceled()
+
+    # Import différé : charge python-docx seulement quand un rapport est demandé
+    from .report_generator import ReportGenerator
+
+    image_exporter = ImageExporter(layer_manager, base_cache=base_cache)
+    report_generator = ReportGenerator(layer_manager, image_exporter, output_dir, feedback=feedback)
+    return report_generator.create_word_document(snapshot)
+
+
+def run_kml_job(layers, settings, analysis_id, analysis_label, output_dir, feedback=None, snapshot=None, tracer=None):
+    """
+    Exporte en KML la zone source, les zones faisable/conditionnelle et les restrictions d'une analyse.
+
+    :param layers: Couches résolues par `LayerManager.resolve_layers` (entités lues dans leurs sources).
+    :param settings: `ConfigSnapshot` de la technologie.
+    :param output_dir: Répertoire racine choisi par l'utilisateur.
+    :param feedback: Retour de progression (`JobFeedback` ou tâche de fond).
+    :param snapshot: `RestrictionSnapshot` déjà lu (optionnel).
+    :param tracer: `Tracer` du traitement (optionnel), terminé par l'appelant.
+    :return: Répertoire (ou archive, selon `KML_OUTPUT_MODE`) contenant les fichiers KML.
+    """
+    feedback = feedback or JobFeedback()
+
+    parent_directory = os.path.join(output_dir, f"[Vmap-KML]{settings.technology}-{settings.analyse_type}={analysis_label}")
+    sources = layers['sources']
+    output = open_kml_output(parent_directory)
+    try:
+        feedback.set_stage("Exporting source area")
+        KMLEXporter.export_source_area_kml(settings, sources['area'], analysis_id, analysis_label, output,
+                                           tracer=tracer)
+        feedback.check_canceled()
+
+        feedback.set_stage("Exporting feasible areas")
+        KMLEXporter.export_feasible_area_kml(settings, sources['feasible'], analysis_id, output, tracer=tracer)
+        KMLEXporter.export_conditional_area_kml(settings, sources['conditional'], analysis_id, output, tracer=tracer)
+        feedback.check_canceled()
+
+        KMLEXporter.export_restrictions_kml(settings, sources['restriction'], analysis_id, output,
+                                            feedback=feedback, snapshot=snapshot, tracer=tracer)
+    except BaseException:
+        # Pas d'archive tronquée laissée derrière une erreur ou une annulation
+        output.discard()
+        raise
+    output.close()
+    return output.path
+
+
+def run_all_job(layer_manager, output_dir, feedback=None, base_cache=None):
+    """
+    Génère le rapport Word puis l'export KML d'une analyse à partir d'une seule
+    lecture des restrictions.
+
+    :param layer_manager: `LayerManager` sur lequel `setup_layers()` a été appelé.
+    :param output_dir: Répertoire de sortie.
+    :param feedback: Retour de progression (`JobFeedback` ou tâche de fond).
+    :param base_cache: Fonds déjà rendus pour cette analyse par la préparation anticipée (optionnel).
+    :return: Tuple (chemin du rapport Word, répertoire des fichiers KML).
+    """
+    feedback = feedback or JobFeedback()
+
+    report_path = run_report_job(layer_manager, output_dir, feedback=feedback, base_cache=base_cache)
+    feedback.check_canceled()
+
+    kml_directory = run_kml_job(
+        layer_manager.layers, layer_manager.settings, layer_manager.analysis_id,
+        layer_manager.analysis_label, output_dir, feedback=feedback,
+        snapshot=layer_manager.get_restriction_snapshot(), tracer=layer_manager.tracer
+    )
+    return report_path, kml_directory
@@ -1,66 +1,61 @@
 from ..imports import *
 from ..config import Config
+from .restriction_snapshot import RestrictionSnapshot
+from .kml_writer import KMLWriter
 
 class KMLEXporter:
-    """Gère les opérations d'exportation en format KML."""
+    """
+    Gère les opérations d'exportation en format KML.
+
+    Les entités sont lues dans les sources des couches (`LayerManager.resolve_layers`),
+    utilisables depuis une tâche de fond.
+    """
 
     @staticmethod
-    def export_kml(features, output_path, fields_to_export=None, layer_name="temp_kml_layer"):
+    def export_kml(features, output, relative_path, fields_to_export=None, writer=None, tracer=None):
+        """
+        Écrit des entités dans un fichier KML.
+
+        :param output: Sortie KML (répertoire ou archive, voir `kml_output`).
+        :param relative_path: Chemin du fichier dans la sortie.
+
+        :param fields_to_export: Champs exportés {champ: type} (ignoré si `writer` est fourni).
+        :param writer: `KMLWriter` partagé entre plusieurs fichiers (optionnel).
+        :param tracer: `Tracer` du traitement (optionnel) : une mesure « write kml » par fichier.
+        :return: Nombre d'entités écrites.
+        """
         if not features:
-            return
+            return 0
 
-        fields = QgsFields()
-        if fields_to_export:
-            for field_name, field_type in fields_to_export.items():
-                # Conversion des types depuis le JSON
-                if field_type == "QVariant.Int":
-                    qtype = QVariant.Int
-                elif field_type == "QVariant.String":
-                    qtype = QVariant.String
-                else:  # Par défaut
-                    qtype = QVariant.String
-                    
-                fields.append(QgsField(field_name, qtype))
-
-        crs = QgsCoordinateReferenceSystem("EPSG:3857")
-        mem_layer = QgsVectorLayer(f"Polygon?crs={crs.authid()}", layer_name, "memory")
-        mem_layer_data = mem_layer.dataProvider()
-        mem_layer_data.addAttributes(fields)
-        mem_layer.updateFields()
-
-        for feature in features:
-            new_feature = QgsFeature()
-            new_feature.setGeometry(feature.geometry())
-
-            if fields_to_export:
-                attributes = []
-                for field_name in fields_to_export.keys():
-                    attributes.append(feature[field_name])
-                new_feature.setAttributes(attributes)
-
-            mem_layer_data.addFeature(new_feature)
-
-        options = QgsVectorFileWriter.SaveVectorOptions()
-        options.driverName = "KML"
-        options.fileEncoding = "UTF-8"
-        error = QgsVectorFileWriter.writeAsVectorFormatV2(
-            mem_layer,
-            output_path,
-            QgsProject.instance().transformContext(),
-            options
-        )
-
-        return error
+        writer = writer or KMLWriter(fields_to_export)
+        if tracer is None:
+            return writer.write(features, output, relative_path)
+        with tracer.span("write kml", files=1) as counts:
+            counts['features'] = writer.write(features, output, relative_path)
+        return counts['features']
 
     @staticmethod
-    def export_source_area_kml(layer, analysis_id, analysis_label, output_dir):
+    def log_reduction(writer, export_label):
+        """
+        Journalise la réduction des géométries obtenue par simplification / précision.
+        """
+        if writer.reduces:
+            QgsMessageLog.logMessage(f"KML {export_label}: {writer.reduction_summary()}", "ABEI GIS", Qgis.Info)
+
+    @staticmethod
+    def export_source_area_kml(settings, source, analysis_id, analysis_label, output, tracer=None):
         """
         Exporte la zone source en KML, gère automatiquement le cas DC sans source_buffer.
+
+        :param settings: `ConfigSnapshot` de la technologie.
+        :param source: Source des zones d'analyse (`QgsVectorLayerFeatureSource`).
+        :param output: Sortie KML (répertoire ou archive, voir `kml_output`).
+        :param tracer: `Tracer` du traitement (optionnel).
         """
         try:
             # 1. Récupère l'entité
-            features = list(layer.getFeatures(
-                QgsFeatureRequest().setFilterExpression(f"{Config.get_id_field()} = {analysis_id}")
+            features = list(source.getFeatures(
+                QgsFeatureRequest().setFilterExpression(f"{settings.id_field} = {analysis_id}")
             ))
             if not features:
                 QgsMessageLog.logMessage(
@@ -71,29 +66,25 @@ class KMLEXporter:
 
             # 2. Détermine le nom du fichier
             buffer_km = ""
-            if Config.CURRENT_MODE == 'FC' and 'source_buffer' in features[0].fields():
+            if settings.mode == 'FC' and 'source_buffer' in features[0].fields():
                 buffer_value = features[0]['source_buffer']
                 if buffer_value is not None:
                     buffer_km = f"_{int(buffer_value) // 1000}km"
             
             output_filename = f"Source-area{buffer_km}.kml"
-            output_path = os.path.join(output_dir, output_filename)
 
             # 3. Export KML avec les champs adaptés
             fields_to_export = {
-                k: v for k, v in Config.get_kml_source_fields().items() 
+                k: v for k, v in settings.kml_source_fields.items() 
                 if k in features[0].fields()
             }
 
-            error = KMLEXporter.export_kml(
-                layer.getFeatures(QgsFeatureRequest().setFilterExpression(f"{Config.get_id_field()} = {analysis_id}")),
-                output_path,
-                fields_to_export=fields_to_export,
-                layer_name="source_area"
-            )
-
-            if error[0] != QgsVectorFileWriter.NoError:
-                raise Exception(f"KML export error: {error[1]}")
+            writer = KMLWriter.for_export('source', fields_to_export)
+            try:
+                KMLEXporter.export_kml(features, output, output_filename, writer=writer, tracer=tracer)
+            except OSError as e:
+                raise Exception(f"KML export error: {str(e)}")
+            KMLEXporter.log_reduction(writer, "Source area")
 
         except Exception as e:
             QgsMessageLog.logMessage(
@@ -103,113 +94,165 @@ class KMLEXporter:
             raise
 
     @staticmethod
-    def export_feasible_area_kml(config, analysis_id, output_dir):
+    def export_feasible_area_kml(settings, source, analysis_id, output, tracer=None):
         """
         Exporte la zone faisable en fichier KML.
 
-        :param config: La configuration contenant les informations de la couche faisable.
+        :param settings: `ConfigSnapshot` contenant les informations de la couche faisable.
+        :param source: Source de la couche faisable (None si la couche est absente).
         :param analysis_id: L'ID de la fonctionnalité.
-        :param output_dir: Le répertoire de sortie pour les fichiers KML.
+        :param output: La sortie KML (répertoire ou archive).
+        :param tracer: `Tracer` du traitement (optionnel).
         """
-        feasible_layer = QgsProject.instance().mapLayersByName(config['feasible_layer'])
-        if not feasible_layer:
+        if source is None:
             return
 
-        feasible_layer = feasible_layer[0]
-        request = QgsFeatureRequest().setFilterExpression(f"{Config.get_id_field()} = {analysis_id}")
-        features = list(feasible_layer.getFeatures(request))
+        request = QgsFeatureRequest().setFilterExpression(f"{settings.id_field} = {analysis_id}")
+        features = list(source.getFeatures(request))
 
         if not features:
             return
 
-        output_path = os.path.join(output_dir, f"Feasible-area.kml")
-        error = KMLEXporter.export_kml(features, output_path,
-                     fields_to_export=Config.get_kml_feasible_fields(),
-                     layer_name="feasible_area")
-
-        if error[0] != QgsVectorFileWriter.NoError:
-            raise Exception(f"Error exporting feasible area: {error[1]}")
+        writer = KMLWriter.for_export('feasible', settings.kml_feasible_fields)
+        try:
+            KMLEXporter.export_kml(features, output, "Feasible-area.kml", writer=writer, tracer=tracer)
+        except OSError as e:
+            raise Exception(f"Error exporting feasible area: {str(e)}")
+        KMLEXporter.log_reduction(writer, "Feasible area")
         
     @staticmethod
-    def export_conditional_area_kml(config, analysis_id, output_dir):
+    def export_conditional_area_kml(settings, source, analysis_id, output, tracer=None):
         """
         Exporte la zone faisable en fichier KML.
 
-        :param config: La configuration contenant les informations de la couche faisable.
+        :param settings: `ConfigSnapshot` contenant les informations de la couche faisable.
+        :param source: Source de la couche conditionnelle (None si la couche est absente).
         :param analysis_id: L'ID de la fonctionnalité.
-        :param output_dir: Le répertoire de sortie pour les fichiers KML.
+        :param output: La sortie KML (répertoire ou archive).
+        :param tracer: `Tracer` du traitement (optionnel).
         """
-        conditional_layer = QgsProject.instance().mapLayersByName(config['conditional_layer'])
-        if not conditional_layer:
+        if source is None:
             return
 
-        conditional_layer = conditional_layer[0]
-        request = QgsFeatureRequest().setFilterExpression(f"{Config.get_id_field()} = {analysis_id}")
-        features = list(conditional_layer.getFeatures(request))
+        request = QgsFeatureRequest().setFilterExpression(f"{settings.id_field} = {analysis_id}")
+        features = list(source.getFeatures(request))
 
         if not features:
             return
 
-        output_path = os.path.join(output_dir, f"Conditional-area.kml")
-        error = KMLEXporter.export_kml(features, output_path,
-                     fields_to_export=Config.get_kml_feasible_fields(),
-                     layer_name="conditional_area")
-
-        if error[0] != QgsVectorFileWriter.NoError:
-            raise Exception(f"Error exporting conditional area: {error[1]}")
+        writer = KMLWriter.for_export('conditional', settings.kml_feasible_fields)
+        try:
+            KMLEXporter.export_kml(features, output, "Conditional-area.kml", writer=writer, tracer=tracer)
+        except OSError as e:
+            raise Exception(f"Error exporting conditional area: {str(e)}")
+        KMLEXporter.log_reduction(writer, "Conditional area")
 
     @staticmethod
-    def export_restrictions_kml(config, analysis_id, output_dir):
+    def export_restrictions_kml(settings, source, analysis_id, output, feedback=None, snapshot=None, tracer=None):
         """
         Exporte les restrictions en fichier KML.
 
-        :param config: La configuration contenant les informations de la couche des restrictions.
+        :param settings: `ConfigSnapshot` contenant les informations de la couche des restrictions.
+        :param source: Source de la couche des restrictions (lue si `snapshot` n'est pas fourni).
         :param analysis_id: L'ID de la fonctionnalité.
-        :param output_dir: Le répertoire de sortie pour les fichiers KML.
+        :param output: La sortie KML (répertoire ou archive).
+        :param feedback: Retour de progression/annulation (optionnel).
+        :param snapshot: `RestrictionSnapshot` déjà lu (optionnel, sinon lu dans la source).
+        :param tracer: `Tracer` du traitement (optionnel).
         """
-        restriction_layer = QgsProject.instance().mapLayersByName(config['restriction_layer'])
-        if not restriction_layer:
-            return
-
-        restriction_layer = restriction_layer[0]
-        request = QgsFeatureRequest().setFilterExpression(f"{config['restri_join_id_field']} = '{analysis_id}' AND type_restriction = '{Config.get_type_restri_strict()}'")
-        features = list(restriction_layer.getFeatures(request))
+        if snapshot is None:
+            snapshot = RestrictionSnapshot.fetch(source, settings, analysis_id)
 
-        if not features:
+        if not snapshot.features:
             return
 
-        grouped_by_label = defaultdict(list)
+        grouped_by_label = snapshot.by_label
         grouped_by_theme = defaultdict(list)
-        for f in features:
-            grouped_by_label[f["label"]].append(f)
-            theme_value = f['theme']
-            theme_display_name = Config.get_display_name(theme_value)
-            grouped_by_theme[theme_display_name].append(f)
-
-        # Export all restrictions by theme
-        for theme_display_name , feats in grouped_by_theme.items():
-            output_path = os.path.join(output_dir, f"[all-restrictions]{theme_display_name}.kml")
-            error = KMLEXporter.export_kml(feats, output_path,
-                         fields_to_export={config['restri_join_id_field']: QVariant.String, Config.get_restri_id(): QVariant.Int, "label": QVariant.String},
-                         layer_name="restrictions")
-
-            if error[0] != QgsVectorFileWriter.NoError:
-                raise Exception(f"Error exporting restrictions by theme {theme_display_name}: {error[1]}")
-
-        # Export detailed restrictions by label
+        # Nom affiché de chaque thème, résolu une fois par thème et non par entité
+        theme_display_names = {}
+        for theme_value, feats in snapshot.by_theme.items():
+            theme_display_names[theme_value] = settings.display_name(theme_value)
+            grouped_by_theme[theme_display_names[theme_value]].extend(feats)
+
+        # Un seul writer : chaque restriction n'est sérialisée qu'une fois (fichier du thème et du label)
+        writer = KMLWriter.for_export('restrictions', {settings.layers['restri_join_id_field']: QVariant.String, settings.restri_id: QVariant.Int, "label": QVariant.String})
+        if tracer is None:
+            writer.prepare(snapshot.features)
+        else:
+            with tracer.span("prepare kml geometries", features=len(snapshot.features)):
+                writer.prepare(snapshot.features)
+        KMLEXporter.log_reduction(writer, "Restrictions")
+
+        # Liste des fichiers : (chemin, entités, description en cas d'erreur)
+        files = []
+        for theme_display_name, feats in grouped_by_theme.items():
+            files.append((f"[all-restrictions]{theme_display_name}.kml", feats, f"restrictions by theme {theme_display_name}"))
+
+        theme_directories = set()
+        # Chemins déjà attribués, sans casse (systèmes de fichiers Windows)
+        used_paths = set()
         for label, feats in grouped_by_label.items():
-            theme_value = feats[0]['theme']
-            theme_display_name = Config.get_display_name(theme_value)
+            theme_value = str(feats[0]['theme']).strip()
+            theme_display_name = theme_display_names.get(theme_value) or settings.display_name(theme_value)
             safelabel = label.replace(" ", "").replace("/", "").replace("\\", "").replace(".","")
 
-            theme_directory = os.path.join(output_dir, "detailed-restrictions", theme_display_name)
-            os.makedirs(theme_directory, exist_ok=True)
+            theme_directory = os.path.join("detailed-restrictions", theme_display_name)
+            theme_directories.add(theme_directory)
+            # Labels réduits au même nom ("Natura 2000" / "Natura2000") : suffixe numéroté,
+            # deux fichiers ne sont jamais écrits en même temps au même chemin
+            relative_path = os.path.join(theme_directory, f"{safelabel}.kml")
+            suffix = 1
+            while relative_path.lower() in used_paths:
+                suffix += 1
+                relative_path = os.path.join(theme_directory, f"{safelabel}-{suffix}.kml")
+            used_paths.add(relative_path.lower())
+            files.append((relative_path, feats, f"restriction {label}"))
 
-            output_path = os.path.join(theme_directory, f"{safelabel}.kml")
-            error = KMLEXporter.export_kml(feats, output_path,
-                         fields_to_export={config['restri_join_id_field']: QVariant.String, Config.get_restri_id(): QVariant.Int, "label": QVariant.String},
-                         layer_name="restriction")
+        for theme_directory in theme_directories:
+            output.makedirs(theme_directory)
 
-            if error[0] != QgsVectorFileWriter.NoError:
-                raise Exception(f"Error exporting restriction {label}: {error[1]}")
-    
\ No newline at end of file
+        KMLEXporter.write_files(writer, output, files, feedback=feedback, tracer=tracer)
+
+    @staticmethod
+    def write_files(writer, output, files, feedback=None, max_workers=None, tracer=None):
+        """
+        Écrit des fichiers KML indépendants en parallèle (écritures disque / réseau).
+        Dans une archive, les entrées sont écrites l'une après l'autre.
+
+        Une erreur sur un fichier n'interrompt pas les autres : les erreurs sont
+        regroupées et levées à la fin.
+
+        :param writer: `KMLWriter` dont les entités ont été préparées (`prepare`).
+        :param output: Sortie KML (répertoire ou archive).
+        :param files: Liste de tuples (chemin dans la sortie, entités, description).
+        :param feedback: Retour de progression/annulation (optionnel).
+        :param max_workers: Nombre maximal d'écritures simultanées (défaut : `Config.KML_WORKERS`).
+        :param tracer: `Tracer` du traitement (optionnel).
+        """
+        max_workers = max(1, max_workers or Config.KML_WORKERS) if output.parallel else 1
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(KMLEXporter.export_kml, feats, output, relative_path, writer=writer, tracer=tracer): description
+                for relative_path, feats, description in files
+            }
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(f"Error exporting {futures[future]}: {str(e)}")
+                    if feedback:
+                        feedback.set_stage("Writing KML", done, len(files))
+                        feedback.check_canceled()
+            except BaseException:
+                # Annulation : les écritures pas encore démarrées sont abandonnées
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if errors:
+            for error in errors:
+                QgsMessageLog.logMessage(error, "ABEI GIS", Qgis.Warning)
+            raise Exception(f"{len(errors)}/{len(files)} KML files could not be written:\n" + "\n".join(errors))
@@ -0,0 +1,201 @@
+from ..imports import *
+from ..config import Config
+
+import io
+import shutil
+import threading
+import zipfile
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+class KMLDirectoryOutput:
+    """
+    Sortie KML en arborescence de fichiers (un fichier .kml par thème et par label).
+    """
+
+    # Les fichiers étant indépendants, ils peuvent être écrits en parallèle
+    parallel = True
+
+    def __init__(self, root):
+        """
+        :param root: Répertoire racine de l'export (créé si besoin).
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def path(self):
+        """Chemin produit (répertoire)."""
+        return self.root
+
+    def makedirs(self, relative_dir):
+        os.makedirs(os.path.join(self.root, relative_dir), exist_ok=True)
+
+    def open(self, relative_path):
+        """
+        Ouvre un fichier texte en écriture ; les répertoires doivent exister (`makedirs`).
+        """
+        return open(os.path.join(self.root, relative_path), 'w', encoding='utf-8')
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """
+        Abandon après une erreur ou une annulation. Les fichiers déjà écrits sont
+        conservés : le répertoire peut contenir un export précédent de l'analyse.
+        """
+        pass
+
+
+class KMZOutput(KMLDirectoryOutput):
+    """
+    Sortie KMZ. Google Earth n'ouvre que le fichier KML racine d'un KMZ (doc.kml,
+    première entrée de l'archive) : les fichiers sont écrits dans un répertoire
+    temporaire voisin, puis regroupés à la fermeture derrière un doc.kml dont les
+    NetworkLink reprennent l'arborescence.
+    """
+
+    def __init__(self, archive_path):
+        """
+        :param archive_path: Chemin de l'archive .kmz.
+        """
+        self.archive_path = archive_path
+        self.files = []
+        self._files_lock = threading.Lock()
+        super().__init__(tempfile.mkdtemp(prefix=".kmz-", dir=os.path.dirname(archive_path) or None))
+
+    @property
+    def path(self):
+        """Chemin produit (archive)."""
+        return self.archive_path
+
+    def open(self, relative_path):
+        with self._files_lock:
+            self.files.append(relative_path.replace(os.sep, '/'))
+        return super().open(relative_path)
+
+    def root_document(self):
+        """
+        doc.kml : un dossier par répertoire, un NetworkLink par fichier.
+
+        Les fichiers détaillés (sous-répertoires) reprennent les entités des fichiers
+        de premier niveau : ils sont masqués à l'ouverture.
+        """
+        tree = {'folders': {}, 'files': []}
+        for entry in sorted(self.files):
+            node = tree
+            for part in entry.split('/')[:-1]:
+                node = node['folders'].setdefault(part, {'folders': {}, 'files': []})
+            node['files'].append(entry)
+
+        def links(node, visible):
+            parts = []
+            for entry in node['files']:
+                name = escape(os.path.splitext(entry.split('/')[-1])[0])
+                parts.append(f'<NetworkLink><name>{name}</name><visibility>{int(visible)}</visibility>'
+                             f'<Link><href>{escape(quote(entry))}</href></Link></NetworkLink>\n')
+            for folder_name, child in node['folders'].items():
+                parts.append(f'<Folder><name>{escape(folder_name)}</name><visibility>0</visibility>\n')
+                parts.extend(links(child, False))
+                parts.append('</Folder>\n')
+            return parts
+
+        name = escape(os.path.splitext(os.path.basename(self.archive_path))[0])
+        return ('<?xml version="1.0" encoding="utf-8" ?>\n'
+                '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+                f'<Document><name>{name}</name>\n'
+                + ''.join(links(tree, True)) +
+                '</Document></kml>\n')
+
+    def close(self):
+        """Écrit l'archive (doc.kml en premier) et supprime le répertoire temporaire."""
+        try:
+            with zipfile.ZipFile(self.archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr('doc.kml', self.root_document())
+                for entry in sorted(self.files):
+                    archive.write(os.path.join(self.root, *entry.split('/')), entry)
+        except BaseException:
+            self._remove_archive()
+            raise
+        finally:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def discard(self):
+        """Supprime les fichiers temporaires et l'archive éventuellement commencée."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._remove_archive()
+
+    def _remove_archive(self):
+        try:
+            os.remove(self.archive_path)
+        except FileNotFoundError:
+            pass
+
+
+class KMLArchiveOutput:
+    """
+    Sortie KML dans une seule archive zip, avec la même arborescence interne
+    que la sortie en répertoire.
+
+    Chaque fichier est compressé au fil de l'écriture (`ZipFile.open(..., 'w')`) :
+    l'archive complète n'est jamais gardée en mémoire.
+    """
+
+    # Une seule entrée de l'archive peut être ouverte en écriture à la fois
+    parallel = False
+
+    def __init__(self, archive_path):
+        """
+        :param archive_path: Chemin de l'archive .zip.
+        """
+        self.archive_path = archive_path
+        self._zip = zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    @property
+    def path(self):
+        """Chemin produit (archive)."""
+        return self.archive_path
+
+    def makedirs(self, relative_dir):
+        # Les répertoires d'une archive zip sont implicites
+        pass
+
+    def open(self, relative_path):
+        """
+        Ouvre une entrée de l'archive en écriture texte (UTF-8).
+        """
+        entry = relative_path.replace(os.sep, '/')
+        return io.TextIOWrapper(self._zip.open(entry, 'w'), encoding='utf-8')
+
+    def close(self):
+        self._zip.close()
+
+    def discard(self):
+        """Ferme et supprime l'archive incomplète (erreur ou annulation)."""
+        try:
+            self._zip.close()
+        except (OSError, ValueError):
+            pass
+        try:
+            os.remove(self.archive_path)
+        except FileNotFoundError:
+            pass
+
+
+def open_kml_output(directory_path, mode=None):
+    """
+    Crée la sortie KML selon le mode configuré (`KML_OUTPUT_MODE` : directory, kmz ou zip).
+
+    :param directory_path: Chemin du répertoire d'export ; en mode archive,
+                           l'archive porte le même nom avec l'extension du mode.
+    :param mode: Mode de sortie (défaut : `Config.KML_OUTPUT_MODE`).
+    """
+    mode = (mode or Config.KML_OUTPUT_MODE).lower()
+    if mode == 'directory':
+        return KMLDirectoryOutput(directory_path)
+    if mode == 'kmz':
+        return KMZOutput(f"{directory_path}.kmz")
+    if mode == 'zip':
+        return KMLArchiveOutput(f"{directory_path}.zip")
+    raise ValueError(f"Unknown KML output mode: {mode}")
@@ -0,0 +1,273 @@
+from ..imports import *
+from ..config import Config
+
+from qgis.analysis import QgsInternalGeometrySnapper, QgsGeometrySnapper
+from xml.sax.saxutils import escape, quoteattr
+
+class KMLWriter:
+    """
+    Écriture directe de fichiers KML, sans couche mémoire ni pilote OGR.
+
+    Produit la même structure que le pilote KML d'OGR (Schema, Folder nommé d'après
+    le fichier, Placemark avec ExtendedData/SchemaData) : les fichiers restent
+    lisibles à l'identique dans Google Earth et QGIS.
+
+    Une même instance peut écrire plusieurs fichiers : chaque entité n'est
+    reprojetée et sérialisée qu'une fois (une restriction figure dans le fichier
+    de son thème et dans celui de son label).
+    """
+
+    # Les couches mémoire de l'ancien export étaient déclarées en EPSG:3857
+    SOURCE_CRS = "EPSG:3857"
+    KML_CRS = "EPSG:4326"
+    # Champs écrits comme le pilote OGR (options NameField / DescriptionField par défaut,
+    # comparées sans casse) : en <name> / <description> du Placemark, hors Schema et SimpleData
+    NAME_FIELD = "name"
+    DESCRIPTION_FIELD = "description"
+
+    def __init__(self, fields_to_export=None, source_crs=None, simplify_tolerance=0, precision=None):
+        """
+        :param fields_to_export: Dictionnaire {champ: type} issu de la configuration
+                                 ("QVariant.Int" -> entier, sinon texte).
+        :param source_crs: SCR des géométries (défaut : `SOURCE_CRS`).
+        :param simplify_tolerance: Tolérance de simplification, en unités du SCR source (0 = aucune).
+        :param precision: Nombre de décimales des coordonnées (None = précision complète).
+        """
+        fields = [
+            (field_name, "int" if field_type == "QVariant.Int" else "string")
+            for field_name, field_type in (fields_to_export or {}).items()
+        ]
+        self.name_field = next((name for name, _ in fields if name.lower() == self.NAME_FIELD), None)
+        self.description_field = next((name for name, _ in fields if name.lower() == self.DESCRIPTION_FIELD), None)
+        self.fields = [(name, field_type) for name, field_type in fields
+                       if name not in (self.name_field, self.description_field)]
+        self.transform = QgsCoordinateTransform(
+            QgsCoordinateReferenceSystem(source_crs or self.SOURCE_CRS),
+            QgsCoordinateReferenceSystem(self.KML_CRS),
+            QgsProject.instance()
+        )
+        self.simplify_tolerance = simplify_tolerance or 0
+        self.precision = precision
+        # Sommets et octets de géométrie avant/après réduction
+        self.stats = {'vertices_in': 0, 'vertices_out': 0, 'bytes_in': 0, 'bytes_out': 0}
+        # id d'entité -> (<name>/<description>, SimpleData, géométrie) déjà sérialisés
+        self._placemarks = {}
+
+    @classmethod
+    def for_export(cls, export_name, fields_to_export=None):
+        """
+        Writer configuré avec la simplification et la précision de l'export
+        (`KML_GEOMETRY` dans param.json).
+
+        :param export_name: source, feasible, conditional ou restrictions.
+        """
+        simplify_tolerance, precision = Config.get_kml_geometry_options(export_name)
+        return cls(fields_to_export, simplify_tolerance=simplify_tolerance, precision=precision)
+
+    @property
+    def reduces(self):
+        """Vrai si les géométries sont simplifiées ou arrondies."""
+        return self.simplify_tolerance > 0 or self.precision is not None
+
+    @staticmethod
+    def _layer_name(output_path):
+        # Même nom que `QgsVectorFileWriter` : nom du fichier jusqu'au premier point
+        return os.path.basename(output_path).split('.')[0]
+
+    @staticmethod
+    def _format_coordinate(value, precision=None):
+        text = f"{value:.{15 if precision is None else precision}f}"
+        if '.' not in text:
+            return text
+        text = text.rstrip('0')
+        return text[:-1] if text.endswith('.') else text
+
+    def _ring(self, points, precision):
+        coordinates = [
+            f"{self._format_coordinate(p.x(), precision)},{self._format_coordinate(p.y(), precision)}"
+            for p in points
+        ]
+        if precision is not None:
+            # Sommets confondus une fois arrondis : un seul est conservé
+            deduplicated = [c for i, c in enumerate(coordinates) if i == 0 or c != coordinates[i - 1]]
+            if len(deduplicated) >= 4:
+                coordinates = deduplicated
+        return " ".join(coordinates), len(coordinates)
+
+    def _polygons(self, geometry, precision):
+        """
+        Sérialise une géométrie surfacique déjà reprojetée.
+
+        :return: Tuple (texte KML, nombre de sommets écrits).
+        """
+        polygons = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+        polygons = [rings for rings in polygons if rings]
+
+        texts = []
+        vertices = 0
+        for rings in polygons:
+            coordinates, count = self._ring(rings[0], precision)
+            vertices += count
+            parts = [f"<outerBoundaryIs><LinearRing><coordinates>{coordinates}</coordinates></LinearRing></outerBoundaryIs>"]
+            for interior in rings[1:]:
+                coordinates, count = self._ring(interior, precision)
+                vertices += count
+                parts.append(f"<innerBoundaryIs><LinearRing><coordinates>{coordinates}</coordinates></LinearRing></innerBoundaryIs>")
+            texts.append(f"<Polygon>{''.join(parts)}</Polygon>")
+
+        if not texts:
+            return "", 0
+        if len(texts) == 1:
+            return texts[0], vertices
+        return f"<MultiGeometry>{''.join(texts)}</MultiGeometry>", vertices
+
+    def _simplified(self, geometry):
+        """
+        Simplification GEOS préservant la topologie (`GEOSTopologyPreserveSimplify`) :
+        pas d'auto-intersection, les trous restent dans leur polygone.
+        """
+        engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        simplified = engine.simplify(self.simplify_tolerance)
+        if simplified is None or simplified.isEmpty():
+            return geometry
+        return QgsGeometry(simplified)
+
+    def _geometry(self, feature, snapper=None):
+        """
+        Simplifie, reprojette (en une fois) et sérialise la géométrie surfacique d'une entité.
+
+        :param snapper: `QgsInternalGeometrySnapper` commun à un lot d'entités : la géométrie
+                        simplifiée est recalée sur celles des entités voisines déjà traitées.
+        """
+        geometry = feature.geometry()
+        if geometry is None or geometry.isNull() or geometry.isEmpty():
+            return ""
+
+        reduced = QgsGeometry(geometry)
+        if self.simplify_tolerance > 0:
+            reduced = self._simplified(reduced)
+            if snapper is not None:
+                snap_feature = QgsFeature(feature.id())
+                snap_feature.setGeometry(reduced)
+                reduced = snapper.snapFeature(snap_feature)
+        reduced.transform(self.transform)
+        text, vertices = self._polygons(reduced, self.precision)
+
+        if self.reduces:
+            original = QgsGeometry(geometry)
+            original.transform(self.transform)
+            original_text, original_vertices = self._polygons(original, None)
+        else:
+            original_text, original_vertices = text, vertices
+
+        self.stats['vertices_in'] += original_vertices
+        self.stats['vertices_out'] += vertices
+        self.stats['bytes_in'] += len(original_text)
+        self.stats['bytes_out'] += len(text)
+        return text
+
+    def reduction_summary(self):
+        """
+        Résumé de la réduction obtenue sur les géométries sérialisées.
+        """
+        stats = self.stats
+
+        def percent(before, after):
+            return f"-{100.0 * (before - after) / before:.0f}%" if before else "-0%"
+
+        return (f"{stats['vertices_in']} -> {stats['vertices_out']} vertices "
+                f"({percent(stats['vertices_in'], stats['vertices_out'])}), "
+                f"{stats['bytes_in'] / 1024:.0f} -> {stats['bytes_out'] / 1024:.0f} KB of coordinates "
+                f"({percent(stats['bytes_in'], stats['bytes_out'])})")
+
+    def _value(self, value, field_type):
+        if field_type == "int":
+            # Valeur non entière (champ joint ou virtuel) : écrite telle quelle, sans interrompre le fichier
+            try:
+                return str(int(value))
+            except (TypeError, ValueError):
+                pass
+        return escape(str(value))
+
+    @staticmethod
+    def _has_value(feature, name):
+        return name is not None and feature[name] is not None and feature[name] != NULL
+
+    def _serialize(self, feature, snapper=None):
+        """
+        Sérialise les attributs exportés et la géométrie d'une entité (une seule fois par entité).
+
+        :return: Tuple (<name>/<description> du Placemark, SimpleData, géométrie).
+        """
+        cached = self._placemarks.get(feature.id())
+        if cached is None:
+            # Comme OGR : espaces de tête retirés
+            header = "".join(
+                f'\t<{tag}>{escape(str(feature[name]).lstrip(" "))}</{tag}>\n'
+                for tag, name in (("name", self.name_field), ("description", self.description_field))
+                if self._has_value(feature, name)
+            )
+            data = "".join(
+                f'\t\t<SimpleData name={quoteattr(name)}>{self._value(feature[name], field_type)}</SimpleData>\n'
+                for name, field_type in self.fields
+                if self._has_value(feature, name)
+            )
+            cached = (header, data, self._geometry(feature, snapper))
+            self._placemarks[feature.id()] = cached
+        return cached
+
+    def prepare(self, features):
+        """
+        Sérialise à l'avance les entités (thread appelant), pour que les écritures
+        en parallèle ne fassent plus que lire le cache.
+
+        Avec simplification, les entités du lot sont recalées entre elles
+        (tolérance de simplification) pour ne pas ouvrir d'espace entre restrictions voisines.
+        """
+        snapper = None
+        if self.simplify_tolerance > 0:
+            snapper = QgsInternalGeometrySnapper(self.simplify_tolerance, QgsGeometrySnapper.PreferNodes)
+        for feature in features:
+            self._serialize(feature, snapper)
+
+    def write(self, features, output, relative_path):
+        """
+        Écrit les entités dans un fichier KML, au fil de l'eau.
+
+        :param features: Entités (itérable).
+        :param output: Sortie KML (répertoire ou archive, voir `kml_output`).
+        :param relative_path: Chemin du fichier .kml dans la sortie.
+        :return: Nombre d'entités écrites.
+        """
+        name = self._layer_name(relative_path)
+        schema_id = quoteattr(name)
+        count = 0
+
+        with output.open(relative_path) as f:
+            f.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+            f.write('<kml xmlns="http://www.opengis.net/kml/2.2">\n')
+            f.write('<Document id="root_doc">\n')
+            if self.fields:
+                f.write(f'<Schema name={schema_id} id={schema_id}>\n')
+                for field_name, field_type in self.fields:
+                    f.write(f'\t<SimpleField name={quoteattr(field_name)} type="{field_type}"></SimpleField>\n')
+                f.write('</Schema>\n')
+            f.write(f'<Folder><name>{escape(name)}</name>\n')
+
+            for feature in features:
+                header, data, geometry = self._serialize(feature)
+                f.write('  <Placemark>\n')
+                f.write(header)
+                if data:
+                    f.write(f'\t<ExtendedData><SchemaData schemaUrl={quoteattr("#" + name)}>\n')
+                    f.write(data)
+                    f.write('\t</SchemaData></ExtendedData>\n')
+                if geometry:
+                    f.write(f'      {geometry}\n')
+                f.write('  </Placemark>\n')
+                count += 1
+
+            f.write('</Folder>\n')
+            f.write('</Document></kml>\n')
+
+        return count
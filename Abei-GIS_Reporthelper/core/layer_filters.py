@@ -0,0 +1,37 @@
+from ..imports import *
+
+class LayerFilterProvider(QgsFeatureFilterProvider):
+    """
+    Filtres d'entités par couche, appliqués par le moteur de rendu (`QgsMapSettings`).
+
+    Remplace les `setSubsetString` sur les couches du projet : le fournisseur de
+    données n'est pas rechargé entre deux captures, plusieurs rendus peuvent tourner
+    en parallèle avec des filtres différents, et la carte de l'utilisateur n'est
+    jamais modifiée. Le filtre s'ajoute (AND) au subset déjà défini sur la couche.
+    """
+
+    def __init__(self, filters=None):
+        """
+        :param filters: Dictionnaire {id de couche: expression de filtre}.
+        """
+        super().__init__()
+        self.filters = dict(filters or {})
+
+    @staticmethod
+    def _layer_id(layer):
+        # Selon la version de QGIS, la couche ou son identifiant est transmis
+        return layer if isinstance(layer, str) else layer.id()
+
+    def layerFilterExpression(self, layer):
+        return self.filters.get(self._layer_id(layer), '')
+
+    def filterFeatures(self, layer, request):
+        expression = self.filters.get(self._layer_id(layer))
+        if expression:
+            request.combineFilterExpression(expression)
+
+    def isFilterThreadSafe(self):
+        return True
+
+    def clone(self):
+        return LayerFilterProvider(self.filters)
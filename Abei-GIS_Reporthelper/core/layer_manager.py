@@ -1,91 +1,231 @@
 from ..imports import *
 from ..config import Config
+from .restriction_snapshot import RestrictionSnapshot
+from .layer_registry import LayerRegistry
+from .tracing import Tracer
+
+# État de rendu d'une couche, relevé dans le thread principal (`LayerManager.capture_styles`)
+LayerStyle = namedtuple('LayerStyle', ['digest', 'opacity', 'blend_mode', 'crs', 'source'])
 
 class LayerManager:
-    """Gère les opérations sur les couches QGIS."""
+    """
+    Gère les opérations sur les couches QGIS.
+
+    Les couches du projet ne sont lues que dans le thread principal (`resolve_layers`,
+    `capture_styles`) : les tâches de fond lisent les entités dans des sources
+    (`QgsVectorLayerFeatureSource`) et le style dans l'état relevé à ce moment-là.
+    """
+
+    # Couches de l'analyse dont les entités sont lues par les traitements
+    FEATURE_LAYERS = ('area', 'conditional', 'feasible', 'restriction')
 
-    def __init__(self, layer_name, analysis_id, analysis_label, config=None):
+    def __init__(self, layer_name, analysis_id, analysis_label, settings=None, layers=None, mode=None, tracer=None):
         """
         Initialise le gestionnaire de couches.
+
+        :param settings: `ConfigSnapshot` de la technologie : contexte d'exécution du traitement
+                         (mode, couches, champs). Déterminé d'après le nom de la couche sinon.
+        :param layers: Couches déjà résolues par `resolve_layers` (optionnel, réutilisées entre analyses) ;
+                       requis hors du thread principal.
+        :param mode: FC ou DC, requis seulement si `settings` n'est pas fourni.
+        :param tracer: `Tracer` des étapes de l'analyse (créé sinon ; partagé avec les exports).
         """
         self.analysis_id = analysis_id
         self.analysis_label = analysis_label
-        self.selected_technology = None
-        self.analysis_data = config if config else {}
-        self.source_layer = QgsProject.instance().mapLayersByName(layer_name)[0]
+        self.selected_technology = settings.tech_code if settings else None
+        self.settings = settings
+        self.analysis_data = settings.layers if settings else {}
+        self.layers = layers
+        self.restriction_snapshot = None
+        self.tracer = tracer or Tracer(f"{analysis_label} (id {analysis_id})")
+        # Renseignés par setup_layers()
+        self.analysis_extent = None
+        self.source_layer = layers['area'] if layers else LayerRegistry.instance().by_name(layer_name)
+        if self.source_layer is None:
+            raise ValueError(f"Layer not found: {layer_name}")
         
+        if settings is None:
+            self._determine_technology(mode)
+
         # Store field names for consistent access
-        self.id_field = Config.get_id_field()
-        self.label_field = Config.get_label_field()
-        
-        if config is None:
-            self._determine_technology()
+        self.id_field = self.settings.id_field
+        self.label_field = self.settings.label_field
 
-    def _determine_technology(self):
+        if self.layers is None:
+            self.layers = self.resolve_layers(self.analysis_data, self.source_layer)
+
+    def _determine_technology(self, mode):
         """
         Détermine la technologie à partir du nom de la couche.
+
+        :param mode: FC ou DC.
         """
+        if mode is None:
+            raise ValueError("A mode (FC or DC) is required to determine the technology")
+
         if self.source_layer:
             layer_name = self.source_layer.name()
-            config_dict = Config.FC_CONFIG if Config.CURRENT_MODE == 'FC' else Config.DC_CONFIG
-            
-            for technology, config in config_dict.items():
-                if re.search(config['global_area_layer'], layer_name):
-                    self.selected_technology = technology
-                    self.analysis_data = config
+
+            for settings in Config.snapshots(mode):
+                if settings.matches_area_layer(layer_name):
+                    self.selected_technology = settings.tech_code
+                    self.settings = settings
+                    self.analysis_data = settings.layers
                     break
 
         if not self.selected_technology:
             raise Exception("Selected layer is not a recognized area layer")
 
+    @staticmethod
+    def find_area_layer(settings):
+        """
+        Trouve dans le projet la couche des zones d'analyse d'une technologie
+        (nom correspondant au motif `global_area_layer`).
+
+        :param settings: `ConfigSnapshot` de la technologie.
+        :return: La première couche correspondante.
+        """
+        layer = LayerRegistry.instance().area_layer(settings)
+        if layer is not None:
+            return layer
+        raise ValueError(f"No layer found matching pattern: {settings.layers['global_area_layer']}")
+
+    @staticmethod
+    def enable_all_rules(layer):
+        """
+        Active toutes les règles d'un moteur de rendu par règles,
+        pour que toutes les restrictions apparaissent sur les captures.
+        """
+        renderer = layer.renderer()
+        if hasattr(renderer, 'rootRule'):
+            def enable_rules(rule):
+                if hasattr(rule, 'children'):
+                    for child in rule.children():
+                        enable_rules(child)
+                rule.setActive(True)
+
+            enable_rules(renderer.rootRule())
+            layer.triggerRepaint()
+
+    @staticmethod
+    def resolve_layers(config, area_layer):
+        """
+        Résout les couches configurées d'une technologie (thread principal).
+        Le résultat peut être partagé entre plusieurs analyses traitées l'une après l'autre.
+
+        Les entités sont ensuite lues dans les sources (`sources`), utilisables depuis
+        une tâche de fond, et le style dans `styles` (voir `capture_styles`).
+
+        :param config: Configuration des couches de la technologie (`ConfigSnapshot.layers`).
+        :param area_layer: Couche des zones d'analyse.
+        :return: Dictionnaire {'area', 'conditional', 'feasible', 'restriction', 'basemap',
+                 'sources', 'styles'}.
+        """
+        by_name = LayerRegistry.instance().by_name
+
+        restriction_layer = by_name(config['restriction_layer'])
+        if restriction_layer is None:
+            raise Exception(f"Restriction layer not found: {config['restriction_layer']}")
+
+        layers = {
+            'area': area_layer,
+            'conditional': by_name(config['conditional_layer']),
+            'feasible': by_name(config['feasible_layer']),
+            'restriction': restriction_layer,
+            'basemap': by_name(Config.BASEMAP),
+        }
+        layers['sources'] = {
+            key: QgsVectorLayerFeatureSource(layers[key]) if layers[key] else None
+            for key in LayerManager.FEATURE_LAYERS
+        }
+        LayerManager.capture_styles(layers)
+        return layers
+
+    @staticmethod
+    def style_digest(layer):
+        """
+        Empreinte du style d'une couche (symbologie, règles actives, opacité...).
+        """
+        style = QgsMapLayerStyle()
+        style.readFromLayer(layer)
+        content = f"{style.xmlData()}|{layer.opacity()}|{int(layer.blendMode())}"
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def capture_styles(layers):
+        """
+        Relève (thread principal) l'état de rendu des couches résolues : à refaire
+        après toute modification du style, comme `enable_all_rules`.
+
+        :param layers: Dictionnaire renvoyé par `resolve_layers`, complété de 'styles' :
+                       {id de couche: `LayerStyle`}.
+        """
+        layers['styles'] = {
+            layer.id(): LayerStyle(LayerManager.style_digest(layer), layer.opacity(), layer.blendMode(),
+                                   layer.crs().authid(), layer.source())
+            for layer in (layers[key] for key in LayerManager.FEATURE_LAYERS + ('basemap',))
+            if layer is not None
+        }
+
     def setup_layers(self):
         """
         Configure les couches pour le traitement.
         """
-        self.source_layer.select([])
-        
+        with self.tracer.span("setup layers"):
+            self._setup_layers()
+
+    def _setup_layers(self):
         # Use the stored id_field
-        request = QgsFeatureRequest().setFilterExpression(f'"{self.id_field}" = {self.analysis_id}')
-        feature = next(self.source_layer.getFeatures(request))
+        analysis_filter = f'"{self.id_field}" = {self.analysis_id}'
+        request = QgsFeatureRequest().setFilterExpression(analysis_filter)
+        feature = next(self.layers['sources']['area'].getFeatures(request))
         self.analysis_extent = feature.geometry().boundingBox()
 
+        layers = self.layers
         self.area_layer = self.source_layer
-        self.conditional_layer = QgsProject.instance().mapLayersByName(self.analysis_data['conditional_layer'])[0] if QgsProject.instance().mapLayersByName(self.analysis_data['conditional_layer']) else None
-        self.feasible_layer = QgsProject.instance().mapLayersByName(self.analysis_data['feasible_layer'])[0] if QgsProject.instance().mapLayersByName(self.analysis_data['feasible_layer']) else None
-        self.restriction_layer = QgsProject.instance().mapLayersByName(self.analysis_data['restriction_layer'])[0]
-        
-        self.area_layer.setSubsetString(f'"{self.id_field}" = {self.analysis_id}')
-        if self.feasible_layer:
-            self.feasible_layer.setSubsetString(f'"{self.id_field}" = {self.analysis_id}')
-        if self.conditional_layer:
-            self.conditional_layer.setSubsetString(f'"{self.id_field}" = {self.analysis_id}')
+        self.conditional_layer = layers['conditional']
+        self.feasible_layer = layers['feasible']
+        self.restriction_layer = layers['restriction']
 
-    def get_restriction_features(self):
+        # Filtres appliqués au rendu uniquement (voir LayerFilterProvider) :
+        # les couches du projet ne sont pas modifiées
+        self.layer_filters = {
+            layer.id(): analysis_filter
+            for layer in (self.area_layer, self.feasible_layer, self.conditional_layer)
+            if layer
+        }
+
+    def get_restriction_snapshot(self):
         """
-        Récupère les entités de restrictions.
+        Récupère les restrictions strictes de l'analyse (lues une seule fois).
+
+        :return: `RestrictionSnapshot` partagé par le rapport et l'export KML.
         """
-        # Use the restri_join_id_field from the config
-        request = QgsFeatureRequest().setFilterExpression(
-            f'"{self.analysis_data["restri_join_id_field"]}" = \'{self.analysis_id}\' '
-            f'AND "type_restriction" = \'{Config.get_type_restri_strict()}\''
-        )
-        features = list(self.restriction_layer.getFeatures(request))
+        if self.restriction_snapshot is None:
+            with self.tracer.span("fetch restrictions") as counts:
+                self.restriction_snapshot = RestrictionSnapshot.fetch(
+                    self.layers['sources']['restriction'], self.settings, self.analysis_id
+                )
+                counts['features'] = len(self.restriction_snapshot)
 
-        if not features:
+        if not self.restriction_snapshot.features:
             raise Exception(
-                f"No restrictions found for {self.analysis_data['restri_join_id_field']}={self.analysis_id} "
-                f"and type_restriction={Config.get_type_restri_strict()}"
+                f"No restrictions found for {self.settings.layers['restri_join_id_field']}={self.analysis_id} "
+                f"and type_restriction={self.settings.type_restri_strict}"
             )
-        return features
+        return self.restriction_snapshot
+
+    def get_restriction_features(self):
+        """
+        Récupère les entités de restrictions.
+        """
+        return self.get_restriction_snapshot().features
 
     def cleanup(self):
         """
-        Nettoie les couches après traitement.
+        Nettoie après traitement.
+
+        Les filtres n'étant appliqués qu'au rendu, il n'y a plus rien à restaurer
+        sur les couches du projet ; conservé pour les appelants existants.
         """
-        self.restriction_layer.setSubsetString(Config.get_restriction_filter())
-        self.restriction_layer.triggerRepaint()
-        self.area_layer.setSubsetString("")
-        if self.feasible_layer:
-            self.feasible_layer.setSubsetString("")
-        if self.conditional_layer:
-            self.conditional_layer.setSubsetString("")
\ No newline at end of file
+        pass
@@ -0,0 +1,125 @@
+from ..imports import *
+
+import threading
+
+class LayerRegistry:
+    """
+    Index des couches du projet, par nom et par motif de la couche des zones.
+
+    Les recherches ne parcourent plus toutes les couches du projet : l'index est
+    reconstruit une seule fois après chaque modification signalée par le projet
+    (couches ajoutées, supprimées, projet vidé) ou par une couche renommée.
+
+    Une seule instance, créée dans le thread principal au chargement du plugin
+    (`instance`) ; les recherches peuvent ensuite se faire depuis les tâches de fond.
+    """
+
+    _instance = None
+
+    def __init__(self, project=None):
+        """
+        :param project: Projet indexé (défaut : projet courant).
+        """
+        self.project = project or QgsProject.instance()
+        self._lock = threading.RLock()
+        # Nom -> couches portant ce nom (ordre du projet) ; None = à reconstruire
+        self._by_name = None
+        # Motif `global_area_layer` -> première couche correspondante (ou None)
+        self._by_pattern = {}
+        # Couches dont le renommage est suivi (ids)
+        self._watched = set()
+
+        self.project.layersAdded.connect(self._on_layers_added)
+        self.project.layersRemoved.connect(self._on_layers_removed)
+        self.project.cleared.connect(self.invalidate)
+        self._watch(self.project.mapLayers().values())
+
+    @classmethod
+    def instance(cls):
+        """Registre du projet courant (créé au premier appel)."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def release(cls):
+        """Déconnecte et oublie le registre (déchargement du plugin)."""
+        if cls._instance is not None:
+            cls._instance.disconnect()
+            cls._instance = None
+
+    def _watch(self, layers):
+        for layer in layers:
+            if layer.id() not in self._watched:
+                layer.nameChanged.connect(self.invalidate)
+                self._watched.add(layer.id())
+
+    def _on_layers_added(self, layers):
+        self._watch(layers)
+        self.invalidate()
+
+    def _on_layers_removed(self, layer_ids):
+        self._watched.difference_update(layer_ids)
+        self.invalidate()
+
+    def invalidate(self):
+        """Marque l'index comme périmé ; il sera reconstruit à la prochaine recherche."""
+        with self._lock:
+            self._by_name = None
+            self._by_pattern = {}
+
+    def disconnect(self):
+        """Déconnecte les signaux du projet et des couches."""
+        for signal, slot in ((self.project.layersAdded, self._on_layers_added),
+                             (self.project.layersRemoved, self._on_layers_removed),
+                             (self.project.cleared, self.invalidate)):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass
+
+        for layer_id in self._watched:
+            layer = self.project.mapLayer(layer_id)
+            if layer is None:
+                continue
+            try:
+                layer.nameChanged.disconnect(self.invalidate)
+            except (TypeError, RuntimeError):
+                pass
+        self._watched.clear()
+
+    def _index(self):
+        # Appelé avec le verrou
+        if self._by_name is None:
+            by_name = {}
+            for layer in self.project.mapLayers().values():
+                by_name.setdefault(layer.name(), []).append(layer)
+            self._by_name = by_name
+        return self._by_name
+
+    def by_name(self, name):
+        """
+        :return: Première couche portant ce nom, ou None.
+        """
+        if not name:
+            return None
+        with self._lock:
+            layers = self._index().get(name)
+            return layers[0] if layers else None
+
+    def area_layer(self, settings):
+        """
+        Couche des zones d'analyse d'une technologie (nom correspondant au motif
+        `global_area_layer`), mémorisée par motif jusqu'à la prochaine modification.
+
+        :param settings: `ConfigSnapshot` de la technologie.
+        :return: La première couche correspondante, ou None.
+        """
+        key = settings.area_layer_pattern.pattern
+        with self._lock:
+            if key not in self._by_pattern:
+                self._by_pattern[key] = next(
+                    (layers[0] for name, layers in self._index().items() if settings.matches_area_layer(name)),
+                    None
+                )
+            return self._by_pattern[key]
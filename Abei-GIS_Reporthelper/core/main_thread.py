@@ -0,0 +1,64 @@
+from ..imports import *
+
+import threading
+
+class _MainThreadInvoker(QObject):
+    """Exécute dans le thread principal les fonctions reçues (connexion bloquante)."""
+
+    invoke = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.invoke.connect(self._run, Qt.BlockingQueuedConnection)
+
+    @pyqtSlot(object)
+    def _run(self, call):
+        call()
+
+
+_invoker = None
+_invoker_lock = threading.Lock()
+
+
+def _main_thread_invoker():
+    global _invoker
+    with _invoker_lock:
+        if _invoker is None:
+            invoker = _MainThreadInvoker()
+            invoker.moveToThread(QCoreApplication.instance().thread())
+            _invoker = invoker
+        return _invoker
+
+
+def in_main_thread():
+    """Vrai dans le thread principal (interface, projet et couches)."""
+    app = QCoreApplication.instance()
+    return app is None or QThread.currentThread() == app.thread()
+
+
+def run_in_main_thread(function, *args, **kwargs):
+    """
+    Exécute une fonction dans le thread principal et renvoie son résultat.
+
+    Depuis une tâche de fond, l'appel attend que le thread principal l'ait traité :
+    seules les étapes qui lisent les couches du projet (préparation des rendus)
+    passent par ici, le reste du traitement reste dans la tâche. Appelée depuis
+    le thread principal, la fonction est exécutée directement.
+
+    Les exceptions levées par la fonction sont relancées dans le thread appelant.
+    """
+    if in_main_thread():
+        return function(*args, **kwargs)
+
+    outcome = {}
+
+    def call():
+        try:
+            outcome['result'] = function(*args, **kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+
+    _main_thread_invoker().invoke.emit(call)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
@@ -0,0 +1,142 @@
+from ..imports import *
+
+class _OverlayTarget:
+    """
+    Calque transparent en cours de rendu : image, peintre, contexte et moteur de rendu.
+    Créé dans le thread principal (lecture de la couche), dessiné ensuite depuis n'importe quel thread.
+    """
+
+    def __init__(self, layer, map_settings, transform):
+        self.image = QImage(map_settings.outputSize(), map_settings.outputImageFormat())
+        dots_per_meter = int(map_settings.outputDpi() / 0.0254)
+        self.image.setDotsPerMeterX(dots_per_meter)
+        self.image.setDotsPerMeterY(dots_per_meter)
+        self.image.fill(Qt.transparent)
+
+        self.painter = QPainter(self.image)
+        self.context = QgsRenderContext.fromMapSettings(map_settings)
+        self.context.setPainter(self.painter)
+        # Anticrénelage et autres options du rendu, comme `QgsMapRendererJob`
+        self.context.setPainterFlagsUsingContext(self.painter)
+        # Mode de fusion des entités entre elles (celui de la couche est appliqué à la composition)
+        self.painter.setCompositionMode(layer.featureBlendMode())
+        if transform.isValid():
+            self.context.setCoordinateTransform(transform)
+            self.context.setExtent(transform.transformBoundingBox(
+                map_settings.visibleExtent(), QgsCoordinateTransform.ReverseTransform))
+
+        expression_context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(layer))
+        expression_context.appendScope(QgsExpressionContextUtils.mapSettingsScope(map_settings))
+        self.context.setExpressionContext(expression_context)
+
+        self.renderer = layer.renderer().clone()
+        self.fields = QgsFields(layer.fields())
+        self.started = False
+
+    def start(self):
+        self.renderer.startRender(self.context, self.fields)
+        self.started = True
+
+    def finish(self):
+        if self.started:
+            self.renderer.stopRender(self.context)
+        self.painter.end()
+
+
+class MultiTargetOverlayRenderer:
+    """
+    Rend plusieurs calques de restrictions en une seule lecture des entités.
+
+    Chaque entité est dessinée, avec la symbologie de la couche, dans tous les
+    calques auxquels elle appartient (son label, son thème, l'aperçu...), au lieu
+    d'un rendu complet de la couche par calque avec un filtre différent.
+
+    Limites : ni étiquettes, ni niveaux de symboles, ni ordre de rendu des entités,
+    ni effet de rendu de la couche ; `ImageExporter` revient au rendu classique
+    quand la couche en utilise.
+
+    Comme pour `QgsMapRendererJob`, tout ce qui lit la couche est fait par `prepare`,
+    dans le thread principal ; `render` ne fait que dessiner et peut tourner dans une tâche.
+    """
+
+    def __init__(self, layer, map_settings):
+        """
+        :param layer: Couche des restrictions (symbologie utilisée pour le rendu).
+        :param map_settings: Paramètres de rendu communs à tous les calques (emprise, taille).
+        """
+        self.layer = layer
+        self.map_settings = map_settings
+        self.transform = None
+        self.targets = None
+
+    @staticmethod
+    def supports(layer):
+        """
+        Indique si la couche peut être rendue en une passe sans différence visible.
+        """
+        renderer = layer.renderer()
+        if renderer is None or layer.labelsEnabled() or renderer.usingSymbolLevels():
+            return False
+        if renderer.orderByEnabled():
+            return False
+        effect = renderer.paintEffect()
+        return effect is None or not effect.enabled()
+
+    def prepare(self, count):
+        """
+        Crée les calques à produire : symbologie, champs et contexte lus dans la couche.
+        À appeler dans le thread principal.
+
+        :param count: Nombre de calques.
+        """
+        self.transform = QgsCoordinateTransform()
+        if self.layer.crs().isValid() and self.map_settings.destinationCrs().isValid():
+            self.transform = QgsCoordinateTransform(self.layer.crs(), self.map_settings.destinationCrs(),
+                                                    QgsProject.instance())
+        self.targets = [_OverlayTarget(self.layer, self.map_settings, self.transform) for _ in range(count)]
+
+    def render(self, feature_sets, on_feature=None, bounding_boxes=None):
+        """
+        Dessine les calques préparés par `prepare` (préparés ici sinon, depuis le thread principal).
+
+        :param feature_sets: Liste de listes d'entités, une par calque à produire.
+        :param on_feature: Appelé après chaque entité dessinée (annulation possible).
+        :param bounding_boxes: Emprises des entités {fid: QgsRectangle} ; sans reprojection,
+                               les entités hors de l'emprise de rendu sont ignorées.
+        :return: Liste de QImage transparentes, dans l'ordre de `feature_sets`.
+        """
+        # Index entité -> calques cibles ; chaque entité n'est parcourue qu'une fois
+        targets_by_fid = defaultdict(list)
+        features = {}
+        for index, feats in enumerate(feature_sets):
+            for f in feats:
+                targets_by_fid[f.id()].append(index)
+                features.setdefault(f.id(), f)
+
+        if self.targets is None:
+            self.prepare(len(feature_sets))
+        targets, transform = self.targets, self.transform
+        if len(targets) != len(feature_sets):
+            raise ValueError(f"{len(targets)} overlays prepared, {len(feature_sets)} requested")
+
+        # Emprises comparables à l'emprise de rendu uniquement sans reprojection
+        visible_extent = self.map_settings.visibleExtent()
+        cull = bool(bounding_boxes) and (not transform.isValid() or transform.isShortCircuited())
+        try:
+            for target in targets:
+                target.start()
+            for fid, feature in features.items():
+                if cull and fid in bounding_boxes and not bounding_boxes[fid].intersects(visible_extent):
+                    continue
+                for index in targets_by_fid[fid]:
+                    target = targets[index]
+                    target.context.expressionContext().setFeature(feature)
+                    target.renderer.renderFeature(feature, target.context)
+                if on_feature:
+                    on_feature()
+        finally:
+            for target in targets:
+                target.finish()
+            self.targets = None
+
+        return [target.image for target in targets]
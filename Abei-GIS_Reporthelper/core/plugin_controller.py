@@ -1,36 +1,80 @@
 from ..imports import *
-from .kml_exporter import KMLEXporter
-from .report_generator import ReportGenerator
 from .layer_manager import LayerManager
-from ..config import Config
-from .image_exporter import ImageExporter
+from .tasks import ReportTask, KMLTask, ExportAllTask, WarmupTask
+from .batch import BatchTask, collect_analyses
 
 class PluginController:
     def __init__(self, widget):
         self.widget = widget
+        self.active_task = None
+        # Préparation anticipée de l'analyse sélectionnée, et sa clé (configuration figée, id)
+        self.warmup = None
+        self.warmup_key = None
+
+    def _start_task(self, task, on_completed, on_error):
+        """
+        Lance une tâche de fond et relie sa progression au statut du dock.
+
+        :param on_completed: Appelé (thread principal) avec la tâche en cas de succès.
+        :param on_error: Appelé (thread principal) avec l'exception en cas d'échec.
+        """
+        def completed():
+            self.active_task = None
+            self.widget.set_busy(False)
+            on_completed(task)
+
+        def terminated():
+            self.active_task = None
+            self.widget.set_busy(False)
+            if task.exception:
+                on_error(task.exception)
+            else:
+                self.widget.update_status("Canceled", error=True)
+
+        task.stageChanged.connect(self.widget.update_status)
+        task.taskCompleted.connect(completed)
+        task.taskTerminated.connect(terminated)
+
+        self.active_task = task
+        self.widget.set_busy(True)
+        QgsApplication.taskManager().addTask(task)
+
+    def cancel_task(self):
+        """
+        Annule la tâche en cours, s'il y en a une.
+
+        :return: True si une tâche a été annulée.
+        """
+        if self.active_task is None:
+            return False
+        self.widget.update_status("Canceling...")
+        self.active_task.cancel()
+        return True
+
+    def _on_kml_error(self, e):
+        QMessageBox.critical(self.widget, "Error", f"Error during KML export:\n{str(e)}")
+        QgsMessageLog.logMessage(f"KML export error: {str(e)}", "FC Report", Qgis.Critical)
+
+    def _on_report_error(self, e):
+        settings = self.widget.current_settings()
+        error_msg = f"""Error generating report:
+            {str(e)}
+
+            Selected analysis fields: {self.widget.selected_analysis.fields().names() if hasattr(self.widget, 'selected_analysis') and self.widget.selected_analysis else 'No object selected'}
+
+            Config ID field: {settings.id_field if settings else 'No technology selected'}
+            Config label field: {settings.label_field if settings else 'No technology selected'}
+            Current mode: {self.widget.mode}"""
+
+        QMessageBox.critical(self.widget, "Critical Error", error_msg)
 
     def export_to_kml(self):
         try:
             if not self.widget.selected_analysis:
                 raise ValueError("No analysis selected")
 
-            technology = self.widget.technology_combo.currentData()
-            if not technology:
-                raise ValueError("Please select a technology type")
-
-            config = Config.get_config(technology)
-
-            layer_name_pattern = config['global_area_layer']
-            matching_layers = [layer for layer in QgsProject.instance().mapLayers().values()
-                            if re.search(layer_name_pattern, layer.name())]
-
-            if not matching_layers:
-                raise ValueError(f"No layer found matching pattern: {layer_name_pattern}")
-
-            layer = matching_layers[0]
+            settings, layer, analysis_id, analysis_label = self._resolve_analysis(self.widget.selected_analysis)
             iface.setActiveLayer(layer)
-            analysis_id = self.widget.selected_analysis[Config.get_id_field()]
-            analysis_label = self.widget.selected_analysis[Config.get_label_field()] if Config.get_label_field() in self.widget.selected_analysis.fields().names() else f"id_{analysis_id}"
 
             output_dir = QFileDialog.getExistingDirectory(
                 self.widget,
@@ -41,125 +85,219 @@ class PluginController:
             if not output_dir:
                 return
 
-            current_datetime = QDateTime.currentDateTime().toString("dd-MM-yyyy_hh'h'mm")
-            parent_directory = os.path.join(output_dir, f"[Vmap-KML]{config['technology']}-{Config.get_analyse_type()}={analysis_label}")
-            os.makedirs(parent_directory, exist_ok=True)
+            def on_completed(task):
+                self.widget.update_status("KML files exported")
+                QMessageBox.information(
+                    self.widget,
+                    "Success",
+                    "KML files exported."
+                )
 
-            KMLEXporter.export_source_area_kml(layer, analysis_id, analysis_label, parent_directory)
-            KMLEXporter.export_feasible_area_kml(config, analysis_id, parent_directory)
-            KMLEXporter.export_conditional_area_kml(config, analysis_id, parent_directory)
-            KMLEXporter.export_restrictions_kml(config, analysis_id, parent_directory)
-
-            QMessageBox.information(
-                self.widget,
-                "Success",
-                f"KML files exported."
-            )
+            task = KMLTask(layer, settings, analysis_id, analysis_label, output_dir)
+            self._start_task(task, on_completed, self._on_kml_error)
 
         except Exception as e:
-            QMessageBox.critical(self.widget, "Error", f"Error during KML export:\n{str(e)}")
-            QgsMessageLog.logMessage(f"KML export error: {str(e)}", "FC Report", Qgis.Critical)
+            self._on_kml_error(e)
             
-    def generate_report(self):
+    def _resolve_analysis(self, feature):
+        """
+        Résout la configuration, la couche des zones, l'id et le label d'une analyse.
+
+        :return: Tuple (settings, layer, analysis_id, analysis_label), `settings` étant le `ConfigSnapshot`.
+        """
+        # 1. Get configuration (mode and technology of the dock, frozen for the whole job)
+        settings = self.widget.current_settings()
+        if settings is None:
+            raise ValueError("Please select a technology type")
+
+        # 2. Check and select the correct layer
+        layer = LayerManager.find_area_layer(settings)
+
+        # 3. Get ID and label - with proper field existence checks
+        id_field = settings.id_field
+        label_field = settings.label_field
+        
+        if id_field not in feature.fields().names():
+            raise ValueError(f"ID field '{id_field}' not found in selected feature")
+            
+        analysis_id = feature[id_field]
+        analysis_label = feature[label_field] if label_field in feature.fields().names() else f"id_{analysis_id}"
+        return settings, layer, analysis_id, analysis_label
+
+    def start_warmup(self, feature):
+        """
+        Prépare en tâche de fond l'analyse qui vient d'être sélectionnée : couches,
+        restrictions strictes et fonds de carte des captures. La génération reprend
+        ce qui est déjà fait ; une nouvelle sélection annule la préparation précédente.
+
+        Silencieux : un échec est seulement journalisé, la génération refera le travail.
+        """
+        self.cancel_warmup()
         try:
-            if not self.widget.selected_analysis:
-                raise ValueError("No object selected")
+            settings, layer, analysis_id, analysis_label = self._resolve_analysis(feature)
 
-            # 1. Get configuration
-            technology = self.widget.technology_combo.currentData()
-            if not technology:
-                raise ValueError("Please select a technology type")
+            # Couches résolues dans le thread principal ; les règles ne sont activées
+            # qu'à la génération : une simple sélection ne modifie pas le projet
+            layers = LayerManager.resolve_layers(settings.layers, layer)
+            layer_manager = LayerManager(
+                layer_name=layer.name(),
+                analysis_id=analysis_id,
+                analysis_label=analysis_label,
+                settings=settings,
+                layers=layers
+            )
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Warm-up skipped: {str(e)}", "ABEI GIS", Qgis.Info)
+            return
+
+        task = WarmupTask(layer_manager)
+        self.warmup = task
+        self.warmup_key = (settings, analysis_id)
+        QgsApplication.taskManager().addTask(task)
+
+    def cancel_warmup(self):
+        """Annule la préparation anticipée en cours, s'il y en a une."""
+        if self.warmup is not None:
+            self.warmup.cancel()
+        self.warmup = None
+        self.warmup_key = None
+
+    def _take_warmup(self, settings, analysis_id):
+        """
+        Reprend la préparation anticipée si elle porte sur la même analyse
+        (et la même configuration : param.json n'a pas changé entre-temps).
+
+        :return: La `WarmupTask`, ou None.
+        """
+        warmup = self.warmup
+        if warmup is None or self.warmup_key != (settings, analysis_id):
+            self.cancel_warmup()
+            return None
+        self.warmup = None
+        self.warmup_key = None
+        return warmup
+
+    def _prepare_analysis(self):
+        """
+        Résout la couche et l'analyse sélectionnée, demande le répertoire de sortie
+        et configure le `LayerManager` (thread principal), ou reprend celui de la
+        préparation anticipée.
+
+        :return: Tuple (layer_manager, output_dir, warmup), ou None si l'utilisateur annule.
+        """
+        if not self.widget.selected_analysis:
+            raise ValueError("No object selected")
+
+        settings, layer, analysis_id, analysis_label = self._resolve_analysis(self.widget.selected_analysis)
+        iface.setActiveLayer(layer)
+
+        # 4. Ask for output directory
+        output_dir = QFileDialog.getExistingDirectory(
+            self.widget,
+            "Select Output Directory",
+            os.path.expanduser("~")
+        )
+        if not output_dir:
+            return None
+
+        # 5. Reuse the warm-up of this analysis, or initialize LayerManager with the config
+        warmup = self._take_warmup(settings, analysis_id)
+        if warmup:
+            # La préparation ne rend pas les restrictions : règles activées avant les captures
+            LayerManager.enable_all_rules(warmup.layer_manager.layers['restriction'])
+            return warmup.layer_manager, output_dir, warmup
+
+        layer_manager = LayerManager(
+            layer_name=layer.name(),
+            analysis_id=analysis_id,
+            analysis_label=analysis_label,
+            settings=settings
+        )
+        layer_manager.setup_layers()
+        LayerManager.enable_all_rules(layer_manager.restriction_layer)
+        return layer_manager, output_dir, None
 
-            config = Config.get_config(technology)
+    def generate_report(self):
+        try:
+            prepared = self._prepare_analysis()
+            if not prepared:
+                return
+            layer_manager, output_dir, warmup = prepared
 
-            # 2. Check and select the correct layer
-            layer_name_pattern = config['global_area_layer']
-            matching_layers = [layer for layer in QgsProject.instance().mapLayers().values()
-                            if re.search(layer_name_pattern, layer.name())]
+            # 6. Fetch, render and build the report in the background
+            def on_completed(task):
+                self.widget.update_status("Report generated")
+                QMessageBox.information(
+                    self.widget,
+                    "Success",
+                    f"Report generated: {task.result_path}"
+                )
 
-            if not matching_layers:
-                raise ValueError(f"No layer found matching pattern: {layer_name_pattern}")
+            task = ReportTask(layer_manager, output_dir, warmup=warmup)
+            self._start_task(task, on_completed, self._on_report_error)
 
-            layer = matching_layers[0]
-            iface.setActiveLayer(layer)
-
-            # 3. Get ID and label - with proper field existence checks
-            id_field = Config.get_id_field()
-            label_field = Config.get_label_field()
-            
-            if id_field not in self.widget.selected_analysis.fields().names():
-                raise ValueError(f"ID field '{id_field}' not found in selected feature")
-                
-            analysis_id = self.widget.selected_analysis[id_field]
-            analysis_label = self.widget.selected_analysis[label_field] if label_field in self.widget.selected_analysis.fields().names() else f"id_{analysis_id}"
+        except Exception as e:
+            self._on_report_error(e)
 
-            # 4. Ask for output directory
-            output_dir = QFileDialog.getExistingDirectory(
-                self.widget,
-                "Select Output Directory",
-                os.path.expanduser("~")
-            )
-            if not output_dir:
+    def export_all(self):
+        """
+        Génère le rapport Word et l'export KML de l'analyse sélectionnée
+        avec une seule lecture des restrictions.
+        """
+        try:
+            prepared = self._prepare_analysis()
+            if not prepared:
                 return
+            layer_manager, output_dir, warmup = prepared
 
-            restriction_layer_name = config['restriction_layer']
-            restriction_layer = next((l for l in QgsProject.instance().mapLayers().values()
-                                    if l.name() == restriction_layer_name), None)
+            def on_completed(task):
+                self.widget.update_status("Report and KML files generated")
+                QMessageBox.information(
+                    self.widget,
+                    "Success",
+                    f"Report generated: {task.result_path}\nKML files exported."
+                )
 
-            if restriction_layer:
-                renderer = restriction_layer.renderer()
-                if hasattr(renderer, 'rootRule'):
-                    def enable_rules(rule):
-                        if hasattr(rule, 'children'):
-                            for child in rule.children():
-                                enable_rules(child)
-                        rule.setActive(True)
+            task = ExportAllTask(layer_manager, output_dir, warmup=warmup)
+            self._start_task(task, on_completed, self._on_report_error)
 
-                    enable_rules(renderer.rootRule())
-                    restriction_layer.triggerRepaint()
-
-            # 5. Initialize LayerManager with the config
-            layer_manager = LayerManager(
-                layer_name=layer.name(),
-                analysis_id=analysis_id,
-                analysis_label=analysis_label,
-                config=config
-            )
-            layer_manager.setup_layers()
+        except Exception as e:
+            self._on_report_error(e)
 
-            # 6. Group features
-            features = layer_manager.get_restriction_features()
-            grouped_by_theme = defaultdict(list)
+    def run_batch(self):
+        """
+        Génère rapports et/ou KML pour plusieurs analyses de la technologie courante
+        (sélection, liste d'identifiants ou expression) dans un même répertoire.
+        """
+        from ..ui.batch_dialog import BatchDialog, BatchSummaryDialog
 
-            # Dans la partie groupement des features:
-            for f in features:
-                theme_raw = f['theme']
-                theme_str = str(theme_raw).strip()
-                # On garde la valeur originale pour le groupement
-                grouped_by_theme[theme_str].append(f)
+        try:
+            settings = self.widget.current_settings()
+            if settings is None:
+                raise ValueError("Please select a technology type")
 
-            # 7. Generate report
-            image_exporter = ImageExporter(layer_manager)
-            report_generator = ReportGenerator(layer_manager, image_exporter, output_dir)
-            report_path = report_generator.create_word_document(grouped_by_theme)
+            layer = LayerManager.find_area_layer(settings)
 
-            # 8. Cleanup
-            layer_manager.cleanup()
+            dialog = BatchDialog(settings.technology, layer.selectedFeatureCount(), self.widget)
+            if not dialog.exec_():
+                return
+            params = dialog.values()
 
-            QMessageBox.information(
-                self.widget,
-                "Success",
-                f"Report generated: {report_path}"
-            )
+            analyses = collect_analyses(layer, settings, params['source'], params['value'])
 
-        except Exception as e:
-            error_msg = f"""Error generating report:
-            {str(e)}
+            def on_completed(task):
+                failed = sum(1 for r in task.results if r.status != "success")
+                self.widget.update_status(f"Batch finished - {len(task.results) - failed}/{len(task.results)} succeeded",
+                                          error=bool(failed))
+                BatchSummaryDialog(task.results, task.summary_path, self.widget).exec_()
 
-            Selected analysis fields: {self.widget.selected_analysis.fields().names() if hasattr(self.widget, 'selected_analysis') and self.widget.selected_analysis else 'No object selected'}
+            task = BatchTask(layer, settings, analyses, params['output_dir'],
+                             report=params['report'], kml=params['kml'])
+            self._start_task(task, on_completed, self._on_batch_error)
 
-            Config ID field: {Config.get_id_field()}
-            Config label field: {Config.get_label_field()}
-            Current mode: {Config.CURRENT_MODE}"""
+        except Exception as e:
+            self._on_batch_error(e)
 
-            QMessageBox.critical(self.widget, "Critical Error", error_msg)
\ No newline at end of file
+    def _on_batch_error(self, e):
+        QMessageBox.critical(self.widget, "Error", f"Error during batch generation:\n{str(e)}")
+        QgsMessageLog.logMessage(f"Batch error: {str(e)}", "ABEI GIS", Qgis.Critical)
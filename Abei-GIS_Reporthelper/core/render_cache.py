@@ -0,0 +1,160 @@
+from ..imports import *
+from ..config import Config
+
+import json
+import time
+
+class RenderCache:
+    """
+    Cache disque des captures rendues, conservé d'une session à l'autre.
+
+    Une capture est retrouvée par une clé calculée à partir de tout ce qui influe
+    sur son rendu (emprise, taille, couches et styles, entités et leur contenu) :
+    si rien n'a changé, la capture est relue au lieu d'être rendue à nouveau.
+    La taille totale est plafonnée ; les captures les moins récemment utilisées
+    sont supprimées en premier (date de modification des fichiers).
+    """
+
+    EXTENSION = ".png"
+
+    def __init__(self, directory, max_bytes, max_age=None):
+        """
+        :param directory: Répertoire du cache (créé si besoin).
+        :param max_bytes: Taille maximale du cache, en octets.
+        :param max_age: Durée de validité d'une entrée, en secondes (None = sans expiration).
+                        Les entrées qui expirent gardent leur date d'écriture : l'éviction
+                        supprime alors les plus anciennes en premier.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def default_directory(name="render_cache"):
+        """Répertoire par défaut : dans le profil QGIS de l'utilisateur."""
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), "abei_gis_reporthelper", name)
+
+    @classmethod
+    def from_config(cls, section='RENDER_CACHE'):
+        """
+        Cache configuré dans param.json, ou None s'il est désactivé.
+
+        :param section: `RENDER_CACHE` (captures) ou `BASEMAP_CACHE` (fonds de carte).
+        """
+        options = Config.get_cache_options(section)
+        if not options.get('enabled', True):
+            return None
+        directory = options.get('directory') or cls.default_directory(section.lower())
+        expiry_days = options.get('expiry_days')
+        return cls(directory, int(options.get('max_mb', 500)) * 1024 * 1024,
+                   max_age=expiry_days * 86400 if expiry_days else None)
+
+    @staticmethod
+    def make_key(parts):
+        """
+        Clé de cache à partir d'une structure JSON (listes, dictionnaires, textes, nombres).
+        """
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+    def get(self, key):
+        """
+        :return: QImage en cache, ou None.
+        """
+        path = self._path(key)
+        try:
+            modified = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        if self.max_age is not None and time.time() - modified > self.max_age:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        image = QImage(path)
+        if image.isNull():
+            return None
+        if self.max_age is None:
+            # Marque l'entrée comme récemment utilisée (LRU)
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        return image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+
+    def put(self, key, image):
+        """
+        Enregistre une capture (écriture atomique).
+
+        Fichier temporaire unique par écriture : deux threads peuvent enregistrer
+        la même clé en même temps (jobs FC et DC sur la même zone). Un échec
+        n'est que journalisé, la capture restant utilisable.
+        """
+        path = self._path(key)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            if image.save(temp_path, "PNG"):
+                os.replace(temp_path, path)
+        except OSError as e:
+            QgsMessageLog.logMessage(f"Render cache entry not written: {str(e)}", "ABEI GIS", Qgis.Warning)
+        finally:
+            # Déjà renommé si l'écriture a réussi
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _entries(self):
+        """Fichiers du cache : liste de tuples (date d'utilisation, taille, chemin)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        """Taille totale du cache, en octets."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Supprime les captures les moins récemment utilisées au-delà de la taille maximale.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """
+        Vide le cache.
+
+        :return: Nombre d'octets libérés.
+        """
+        freed = 0
+        for _, size, path in self._entries():
+            try:
+                os.remove(path)
+                freed += size
+            except OSError:
+                pass
+        return freed
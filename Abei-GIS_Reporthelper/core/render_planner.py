@@ -0,0 +1,71 @@
+class RenderPlan:
+    """
+    Plan de rendu d'un rapport : toutes les captures demandées, ramenées à des
+    captures uniques avant tout rendu.
+
+    Deux captures sont identiques si elles portent sur la même emprise, à la même
+    largeur, avec le même ensemble d'entités de restriction (ids triés), quel que
+    soit le filtre qui les a produites (thème à un seul label, labels portant les
+    mêmes entités...).
+    """
+
+    def __init__(self):
+        # Captures uniques à rendre, dans l'ordre de première demande
+        self.requests = []
+        # Pour chaque capture demandée : indice de la capture unique correspondante
+        self.slots = []
+        self._index = {}
+
+    @staticmethod
+    def canonical_key(request):
+        """
+        Clé canonique d'une capture : emprise, largeur et ids des entités
+        (le filtre n'est utilisé que si les entités ne sont pas connues).
+        """
+        extent = request.extent
+        if request.features is not None:
+            content = tuple(sorted(f.id() for f in request.features))
+        else:
+            content = request.subset
+        return (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum(),
+                request.width, content)
+
+    def add(self, request):
+        """
+        Ajoute une capture au plan.
+
+        :param request: `CaptureRequest`.
+        :return: Indice de la capture demandée (position dans le résultat de `render`).
+        """
+        key = self.canonical_key(request)
+        unique_index = self._index.get(key)
+        if unique_index is None:
+            unique_index = len(self.requests)
+            self._index[key] = unique_index
+            self.requests.append(request)
+        self.slots.append(unique_index)
+        return len(self.slots) - 1
+
+    @property
+    def stats(self):
+        """
+        Captures demandées, rendus effectifs et rendus évités.
+        """
+        return {
+            'captures': len(self.slots),
+            'renders': len(self.requests),
+            'saved': len(self.slots) - len(self.requests),
+        }
+
+    def render(self, image_exporter, on_progress=None, bounding_boxes=None):
+        """
+        Rend chaque capture unique une seule fois.
+
+        :param image_exporter: `ImageExporter` de l'analyse.
+        :param on_progress: Appelé après chaque rendu effectif.
+        :param bounding_boxes: Emprises précalculées des entités (optionnel).
+        :return: Liste de QImage, une par capture demandée (dans l'ordre des `add`).
+        """
+        images = image_exporter.export_images(self.requests, on_progress=on_progress,
+                                              bounding_boxes=bounding_boxes)
+        return [images[unique_index] for unique_index in self.slots]
@@ -1,24 +1,47 @@
 from ..imports import *
 from ..config import Config
+from .image_exporter import CaptureRequest
+from .render_planner import RenderPlan
+
+# python-docx (et lxml) : chargés à la première génération de rapport seulement,
+# ce module n'étant importé qu'à ce moment-là
+from docx import Document
+from docx.shared import Inches, Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+import time
 
 class ReportGenerator:
     """Génère des rapports Word pour l'analyse environnementale"""
 
-    def __init__(self, layer_manager, image_exporter, output_directory):
+    # Largeur des captures dans le document (pouces) ; les rendus sont dimensionnés en conséquence
+    CAPTURE_WIDTH = 3.5
+    OVERVIEW_WIDTH = 4.3
+
+    def __init__(self, layer_manager, image_exporter, output_directory, feedback=None):
         """
         Initialise le générateur de rapports.
+
+        :param feedback: Retour de progression/annulation (`JobFeedback` ou tâche de fond), optionnel.
         """
         self.layer_manager = layer_manager
         self.image_exporter = image_exporter
         self.output_directory = output_directory
+        self.feedback = feedback
+        self.tracer = layer_manager.tracer
+        # Captures déjà encodées, par empreinte des pixels et encodage
+        self._encoded_images = {}
+        self._picture_count = 0
+        self.render_plan = None
         self.current_datetime = QDateTime.currentDateTime().toString("dd-MM-yyyy_hh'h'mm")
         self.report_directory = os.path.join(output_directory)
         
         # Store field names from config for consistent access
-        self.id_field = Config.get_id_field()
-        self.label_field = Config.get_label_field()
-        self.restri_join_id_field = layer_manager.analysis_data['restri_join_id_field']
-        self.type_restri_strict = Config.get_type_restri_strict()
+        self.settings = layer_manager.settings
+        self.id_field = self.settings.id_field
+        self.label_field = self.settings.label_field
+        self.restri_join_id_field = self.settings.layers['restri_join_id_field']
+        self.type_restri_strict = self.settings.type_restri_strict
 
         # Logo path setup
         self.logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "icons", "icon.png")
@@ -82,7 +105,7 @@ class ReportGenerator:
 
         data = [
             ("NAME OF PROJECT OR LANDOWNER", self.layer_manager.analysis_label),
-            ("TECHNOLOGY", self.layer_manager.analysis_data['technology']),
+            ("TECHNOLOGY", self.settings.technology),
             ("COUNTY", ""),
             ("TOWNSHIP", ""),
             ("DATE", QDateTime.currentDateTime().toString("dd/MM/yyyy")),
@@ -101,7 +124,7 @@ class ReportGenerator:
                     paragraph.paragraph_format.space_after = Pt(0)
                     paragraph.paragraph_format.space_before = Pt(0)
 
-    def _add_theme_section(self, doc, theme_name, feats, grouped=True):
+    def _add_theme_section(self, doc, theme_name, feats, grouped=True, images=None):
         """
         Ajoute une section thématique au rapport, contenant :
 
@@ -113,6 +136,7 @@ class ReportGenerator:
         :param theme_name: Nom du thème
         :param feats: Liste des entités à afficher
         :param grouped: Regrouper les labels ou non
+        :param images: Captures déjà rendues (une pour le thème, ou une par label trié)
         """
         doc.add_heading(theme_name, level=2)
 
@@ -128,14 +152,18 @@ class ReportGenerator:
         hdr_cells[2].text = 'Notes'
 
         if grouped:
-            self._add_grouped_theme_content(table, feats)
+            self._add_grouped_theme_content(table, feats, images[0])
         else:
-            self._add_individual_theme_content(table, feats)
+            self._add_individual_theme_content(table, feats, images)
 
         doc.add_paragraph()
         
-    def _add_global_feasible_restriction_map(self, doc):
-        """Aperçu dans un tableau sans paramètre obsolète"""
+    def _add_global_feasible_restriction_map(self, doc, image):
+        """
+        Aperçu dans un tableau sans paramètre obsolète
+
+        :param image: Capture de l'aperçu, déjà rendue
+        """
         doc.add_heading("Analysis overview", level=2)
         
         # Tableau ajusté (total 5.5")
@@ -153,89 +181,129 @@ class ReportGenerator:
         row_cells = table.add_row().cells
         row_cells[0].text = ''  # Cellule vide
 
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-            temp_img_path = temp_file.name
-        
-        # subset = f'"{self.restri_join_id_field}" = \'{self.layer_manager.analysis_id}\' AND "type_restriction" = \'{self.type_restri_strict}\''
-        subset = 'null'
-
         try:
-            # Appel SIMPLIFIÉ sans paramètre
-            self.image_exporter.export_image(self.layer_manager.analysis_extent, temp_img_path, subset)
-            
             # Image à 4.3" pour rester dans la marge
             row_cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-            row_cells[1].paragraphs[0].add_run().add_picture(temp_img_path, width=Inches(4.3))
+            self._add_picture(row_cells[1], image, Inches(self.OVERVIEW_WIDTH), 'overview')
         except Exception as e:
             row_cells[1].text = f"Erreur : {str(e)}"
             QgsMessageLog.logMessage(f"Erreur export image : {str(e)}", "ABEI GIS", Qgis.Warning)
-        finally:
-            try: os.remove(temp_img_path)
-            except: pass
         doc.add_paragraph()  # Espace après le tableau
 
-    def _add_grouped_theme_content(self, table, feats):
+    def _theme_subset(self, feats):
+        """
+        Filtre des restrictions strictes de l'analyse pour le thème des entités données.
+        """
+        theme_str = str(feats[0]['theme']).strip()
+        return (f'"{self.restri_join_id_field}" = \'{self.layer_manager.analysis_id}\' '
+                f'AND "type_restriction" = \'{self.type_restri_strict}\' '
+                f'AND "theme" = \'{theme_str}\'')
+
+    def _label_subset(self, label):
+        """
+        Filtre des restrictions strictes de l'analyse pour un label.
+        """
+        escaped_label = label.replace("'", "''")
+        return (f'"{self.restri_join_id_field}" = \'{self.layer_manager.analysis_id}\' '
+                f'AND \"type_restriction\" = \'{self.type_restri_strict}\' '
+                f'AND label = \'{escaped_label}\'')
+
+    @staticmethod
+    def _overview_request(extent):
+        """
+        Capture de l'aperçu : aucune restriction affichée.
+        """
+        # subset = f'"{self.restri_join_id_field}" = \'{self.layer_manager.analysis_id}\' AND "type_restriction" = \'{self.type_restri_strict}\''
+        return CaptureRequest(extent, 'null', [], ReportGenerator.OVERVIEW_WIDTH)
+
+    def _sorted_labels(self, feats):
+        """
+        Labels uniques des entités, triés par ordre alphabétique.
+        """
+        label_field = self.label_field
+        return sorted(set(f[label_field] for f in feats))
+
+    def _set_stage(self, message, done=None, total=None):
+        """
+        Relaie l'étape en cours au feedback et interrompt le traitement s'il est annulé.
+        """
+        if self.feedback:
+            self.feedback.check_canceled()
+            self.feedback.set_stage(message, done, total)
+
+    def _add_picture(self, cell, image, width, capture_type):
+        """
+        Insère une capture (QImage) dans une cellule du tableau.
+        L'image est encodée en mémoire et passée directement à python-docx.
+
+        :param capture_type: overview, theme ou label (encodage défini par `CAPTURE_ENCODING`).
+        """
+        encoding = Config.get_capture_encoding(capture_type)
+        key = (self.image_exporter.image_digest(image), encoding['format'], encoding.get('quality', -1))
+
+        # Captures identiques : encodées une seule fois, mêmes octets pour python-docx
+        # qui ne crée alors qu'une seule image dans le package (dédoublonnage par SHA-1)
+        data = self._encoded_images.get(key)
+        if data is None:
+            with self.tracer.span(f"encode image ({encoding['format']})") as counts:
+                data = self.image_exporter.encode_image(image, encoding['format'], encoding.get('quality', -1))
+                counts['bytes'] = len(data)
+            self._encoded_images[key] = data
+        self._picture_count += 1
+        cell.paragraphs[0].add_run().add_picture(BytesIO(data), width=width)
+
+    def _add_grouped_theme_content(self, table, feats, image):
         """
         Ajoute une ligne au tableau avec tous les labels regroupés d'un thème.
         """
         row_cells = table.add_row().cells
 
         # Use the stored label_field
-        unique_labels = sorted(set(f[Config.get_label_field()] for f in feats))
+        unique_labels = self._sorted_labels(feats)
         row_cells[0].text = "\n".join(f"• {label}" for label in unique_labels)
 
-        theme_str = str(feats[0]['theme']).strip()
-        subset = (f'"{self.restri_join_id_field}" = \'{self.layer_manager.analysis_id}\' '
-                 f'AND "type_restriction" = \'{self.type_restri_strict}\' '
-                 f'AND "theme" = \'{theme_str}\'')
-
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-            temp_img_path = temp_file.name
-
-        self.image_exporter.export_image(self.layer_manager.analysis_extent, temp_img_path, subset)
-
         try:
-            row_cells[1].paragraphs[0].add_run().add_picture(temp_img_path, width=Inches(3.5))
+            self._add_picture(row_cells[1], image, Inches(self.CAPTURE_WIDTH), 'theme')
         except Exception as e:
             row_cells[1].text = f"Error loading image: {str(e)}"
             QgsMessageLog.logMessage(f"Error loading image: {str(e)}", "ABEI GIS", Qgis.Warning)
-        finally:
-            try:
-                os.remove(temp_img_path)
-            except:
-                pass
 
-    def _add_individual_theme_content(self, table, feats):
+    def _add_individual_theme_content(self, table, feats, images):
         """
         Ajoute une ligne par label dans le tableau.
         """
-        # On groupe d'abord par label
-       
         # On trie les labels par ordre alphabétique
-        for label in sorted(set(f[Config.get_label_field()] for f in feats)):
+        for label, image in zip(self._sorted_labels(feats), images):
             row_cells = table.add_row().cells
             row_cells[0].text = label
 
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                temp_img_path = temp_file.name
-
-            subset = (f'"{self.restri_join_id_field}" = \'{self.layer_manager.analysis_id}\' '
-                    f'AND \"type_restriction\" = \'{self.type_restri_strict}\' '
-                    f'AND label = \'{label.replace("'", "''")}\'')
-            
             try:
-                self.image_exporter.export_image(self.layer_manager.analysis_extent, temp_img_path, subset)
-                row_cells[1].paragraphs[0].add_run().add_picture(temp_img_path, width=Inches(3.5))
+                self._add_picture(row_cells[1], image, Inches(self.CAPTURE_WIDTH), 'label')
             except Exception as e:
                 row_cells[1].text = f"Image error: {str(e)}"
                 QgsMessageLog.logMessage(f"Error exporting image for label {label}: {str(e)}", "ABEI GIS", Qgis.Warning)
-            finally:
-                try:
-                    os.remove(temp_img_path)
-                except:
-                    pass
 
-    def create_word_document(self, grouped_by_theme):
+    def plan_captures(self, snapshot):
+        """
+        Construit le plan de rendu du rapport, dans l'ordre du document :
+        aperçu, une capture par thème, puis une par label de chaque thème.
+
+        :param snapshot: `RestrictionSnapshot` des restrictions de l'analyse
+        :return: `RenderPlan` (aussi conservé dans `self.render_plan`)
+        """
+        extent = self.layer_manager.analysis_extent
+        plan = RenderPlan()
+        plan.add(self._overview_request(extent))
+        for feats in snapshot.by_theme.values():
+            plan.add(CaptureRequest(extent, self._theme_subset(feats), feats, self.CAPTURE_WIDTH))
+        for feats in snapshot.by_theme.values():
+            for label in self._sorted_labels(feats):
+                plan.add(CaptureRequest(extent, self._label_subset(label), snapshot.by_label[label], self.CAPTURE_WIDTH))
+
+        self.render_plan = plan
+        return plan
+
+    def create_word_document(self, snapshot):
         """
         Crée l'intégralité du document Word à partir des données d'analyse.
 
@@ -244,7 +312,7 @@ class ReportGenerator:
         - Génère les sections thématiques (groupées et individuelles)
         - Sauvegarde le fichier .docx dans le répertoire spécifié
 
-        :param grouped_by_theme: Dictionnaire de thèmes avec entités associées
+        :param snapshot: `RestrictionSnapshot` des restrictions de l'analyse
         :return: Chemin complet vers le fichier Word généré
         """
         doc = Document()
@@ -252,29 +320,66 @@ class ReportGenerator:
         self._add_header(doc)
         self._add_footer(doc)
 
-        title = doc.add_heading(Config.FC_WORD_TITLE_TEXT, level=0)
+        title = doc.add_heading(self.settings.word_title, level=0)
         title.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
+        # Plan puis rendu en lot de toutes les captures : aperçu, par thème puis par label.
+        # Chaque requête porte ses entités, ce qui permet le rendu des restrictions en une passe.
+        with self.tracer.span("plan captures"):
+            plan = self.plan_captures(snapshot)
+        grouped_by_theme = snapshot.by_theme
+        stats = plan.stats
+        QgsMessageLog.logMessage(
+            f"Render plan: {stats['renders']} renders for {stats['captures']} captures ({stats['saved']} saved)",
+            "[Abei GIS] Report helper", Qgis.Info)
+
+        rendered = [0]
+
+        def on_progress():
+            rendered[0] += 1
+            self._set_stage("Rendering captures", rendered[0], stats['renders'])
+
+        self._set_stage("Rendering captures")
+        with self.tracer.span("render captures", captures=stats['captures'], renders=stats['renders']):
+            images = plan.render(self.image_exporter, on_progress=on_progress, bounding_boxes=snapshot.bounding_boxes)
+        overview_image = images[0]
+        grouped_images = images[1:1 + len(grouped_by_theme)]
+        label_images = iter(images[1 + len(grouped_by_theme):])
+        self._set_stage("Building Word document")
+        # Tableaux et insertion des images (encodage compris)
+        build_started = time.perf_counter()
+
         self._add_general_info(doc)
-        self._add_global_feasible_restriction_map(doc)
+        self._add_global_feasible_restriction_map(doc, overview_image)
         doc.add_paragraph()
 
         doc.add_heading("[GIS analysis] Strict restrictions - Grouped by theme", level=1)
-        for theme_value, feats in grouped_by_theme.items():
-            display_name = Config.get_display_name(theme_value)
+        for (theme_value, feats), image in zip(grouped_by_theme.items(), grouped_images):
+            display_name = self.settings.display_name(theme_value)
             # Ajout du nombre de restrictions dans le titre
-            self._add_theme_section(doc, display_name, feats, grouped=True)
+            self._add_theme_section(doc, display_name, feats, grouped=True, images=[image])
     
             
         # Section Individual
         doc.add_heading("[GIS analysis] Strict restrictions - Individual detail", level=1)
         for theme_value, feats in grouped_by_theme.items():
-            display_name = Config.get_display_name(theme_value)
+            display_name = self.settings.display_name(theme_value)
+            images = [next(label_images) for _ in self._sorted_labels(feats)]
             # On passe grouped=False pour avoir une ligne par label
-            self._add_theme_section(doc, display_name, feats, grouped=False)
+            self._add_theme_section(doc, display_name, feats, grouped=False, images=images)
         
 
-        doc_path = os.path.join(self.report_directory, f"[Vmap-Report]{Config.get_analyse_type()}{self.layer_manager.analysis_data['technology']}={self.layer_manager.analysis_label}.docx")
-        doc.save(doc_path)
-        QgsMessageLog.logMessage(f"Word document created: {doc_path}", "[Abei GIS] Report helper", Qgis.Success)
+        self.tracer.add("build document", build_started, time.perf_counter(), pictures=self._picture_count)
+
+        doc_path = os.path.join(self.report_directory, f"[Vmap-Report]{self.settings.analyse_type}{self.settings.technology}={self.layer_manager.analysis_label}.docx")
+        self._set_stage("Saving document")
+        with self.tracer.span("save document") as counts:
+            doc.save(doc_path)
+            counts['bytes'] = os.path.getsize(doc_path)
+        size_mb = counts['bytes'] / (1024 * 1024)
+        self._set_stage(f"Document saved ({size_mb:.1f} MB)")
+        QgsMessageLog.logMessage(
+            f"Word document created: {doc_path} ({size_mb:.1f} MB, "
+            f"{len(self._encoded_images)} unique images for {self._picture_count} captures)",
+            "[Abei GIS] Report helper", Qgis.Success)
         return doc_path
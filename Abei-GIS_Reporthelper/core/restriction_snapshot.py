@@ -0,0 +1,47 @@
+from ..imports import *
+
+class RestrictionSnapshot:
+    """
+    Restrictions strictes d'une analyse, lues une seule fois dans la couche.
+
+    Le rapport Word et l'export KML consomment le même instantané : entités,
+    regroupements par thème et par label, et emprises précalculées.
+    """
+
+    def __init__(self, features, label_field):
+        """
+        :param features: Entités de restriction de l'analyse.
+        :param label_field: Champ des labels (`ConfigSnapshot.label_field`).
+        """
+        self.label_field = label_field
+        self.features = list(features)
+
+        self.by_theme = defaultdict(list)
+        self.by_label = defaultdict(list)
+        self.bounding_boxes = {}
+        for f in self.features:
+            # On garde la valeur originale du thème pour le groupement
+            self.by_theme[str(f['theme']).strip()].append(f)
+            self.by_label[f[self.label_field]].append(f)
+            self.bounding_boxes[f.id()] = f.geometry().boundingBox()
+
+    @classmethod
+    def fetch(cls, restriction_source, settings, analysis_id):
+        """
+        Lit les restrictions strictes d'une analyse.
+
+        :param restriction_source: Source des restrictions (`QgsVectorLayerFeatureSource`,
+                                   utilisable depuis une tâche de fond, ou la couche elle-même
+                                   dans le thread principal).
+        :param settings: `ConfigSnapshot` de la technologie (champ de jointure, type strict, label).
+        :param analysis_id: Identifiant de l'analyse.
+        :return: `RestrictionSnapshot`, éventuellement vide.
+        """
+        request = QgsFeatureRequest().setFilterExpression(
+            f'"{settings.layers["restri_join_id_field"]}" = \'{analysis_id}\' '
+            f'AND "type_restriction" = \'{settings.type_restri_strict}\''
+        )
+        return cls(restriction_source.getFeatures(request), settings.label_field)
+
+    def __len__(self):
+        return len(self.features)
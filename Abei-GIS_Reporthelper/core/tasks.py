@@ -0,0 +1,184 @@
+from ..imports import *
+from .jobs import JobCanceledError, run_report_job, run_kml_job, run_all_job
+from .image_exporter import ImageExporter
+from .layer_manager import LayerManager
+from .tracing import Tracer
+
+import threading
+
+class AnalysisTask(QgsTask):
+    """
+    Tâche de fond (gestionnaire de tâches QGIS) pour un traitement d'analyse.
+
+    Sert aussi de `feedback` aux jobs : étape courante, progression et annulation.
+    """
+
+    stageChanged = pyqtSignal(str)
+
+    def __init__(self, description):
+        super().__init__(description, QgsTask.CanCancel)
+        self.result_path = None
+        self.exception = None
+        # `Tracer` terminé en fin de tâche (résumé, trace à côté du résultat)
+        self.tracer = None
+
+    def set_stage(self, message, done=None, total=None):
+        """
+        Publie l'étape en cours (signal `stageChanged`) et la progression de la tâche.
+        """
+        if done is not None and total:
+            message = f"{message} {done}/{total}"
+            self.setProgress(100.0 * done / total)
+        self.stageChanged.emit(message)
+
+    def check_canceled(self):
+        """Lève `JobCanceledError` si l'annulation a été demandée."""
+        if self.isCanceled():
+            raise JobCanceledError()
+
+    def run(self):
+        """
+        Exécuté dans un thread de fond. Aucune interaction avec l'interface ici.
+        """
+        try:
+            self.result_path = self._execute()
+            return True
+        except JobCanceledError:
+            return False
+        except Exception as e:
+            self.exception = e
+            return False
+        finally:
+            if self.tracer is not None:
+                self.tracer.finish(self.result_path)
+
+    def _execute(self):
+        raise NotImplementedError
+
+
+class WarmupTask(AnalysisTask):
+    """
+    Préparation anticipée d'une analyse dès sa sélection : couches, restrictions
+    et fonds de carte des captures, avant que la génération ne soit demandée.
+
+    La génération reprend le `LayerManager` et le cache des fonds (`base_cache`)
+    dans l'état où la préparation les a laissés, terminée ou non.
+    """
+
+    def __init__(self, layer_manager):
+        super().__init__(f"[Abei GIS] Warm-up - {layer_manager.analysis_label}")
+        self.layer_manager = layer_manager
+        self.base_cache = {}
+        self._done = threading.Event()
+
+    def _execute(self):
+        from .report_generator import ReportGenerator
+
+        if self.layer_manager.analysis_extent is None:
+            self.layer_manager.setup_layers()
+        self.check_canceled()
+
+        self.layer_manager.get_restriction_snapshot()
+        self.check_canceled()
+
+        image_exporter = ImageExporter(self.layer_manager, base_cache=self.base_cache)
+        for width in (ReportGenerator.OVERVIEW_WIDTH, ReportGenerator.CAPTURE_WIDTH):
+            self.check_canceled()
+            image_exporter.render_base_image(self.layer_manager.analysis_extent, width)
+
+    def run(self):
+        try:
+            return super().run()
+        finally:
+            self._done.set()
+
+    def finished(self, result):
+        # Tâche annulée avant d'avoir démarré : run() n'a jamais été appelé
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """
+        Attend la fin de la préparation (depuis un autre thread de fond).
+
+        :param timeout: Attente maximale, en secondes (None = sans limite).
+        :return: True si la préparation est terminée.
+        """
+        return self._done.wait(timeout)
+
+
+class ReportTask(AnalysisTask):
+    """Génération du rapport Word en tâche de fond."""
+
+    def __init__(self, layer_manager, output_dir, description=None, warmup=None):
+        """
+        :param warmup: `WarmupTask` de la même analyse, dont le travail est repris (optionnel).
+        """
+        super().__init__(description or f"[Abei GIS] Report - {layer_manager.analysis_label}")
+        self.layer_manager = layer_manager
+        # Style relevé dans le thread principal, après `enable_all_rules`
+        LayerManager.capture_styles(layer_manager.layers)
+        self.output_dir = output_dir
+        self.warmup = warmup
+        self.base_cache = warmup.base_cache if warmup else None
+        # Partagé avec la préparation anticipée : ses étapes figurent dans la trace
+        self.tracer = layer_manager.tracer
+
+    def _prepare(self):
+        """
+        Attend la préparation anticipée éventuelle, puis complète ce qu'elle n'a pas fait.
+        """
+        if self.warmup:
+            self.set_stage("Waiting for warm-up")
+            # Attente par tranches : l'annulation de la génération reste immédiate
+            while not self.warmup.wait(0.1):
+                self.check_canceled()
+        if self.layer_manager.analysis_extent is None:
+            self.layer_manager.setup_layers()
+
+    def _execute(self):
+        self._prepare()
+        return run_report_job(self.layer_manager, self.output_dir, feedback=self, base_cache=self.base_cache)
+
+    def cancel(self):
+        """Annule aussi la préparation anticipée reprise, devenue inutile."""
+        if self.warmup:
+            self.warmup.cancel()
+        super().cancel()
+
+    def finished(self, result):
+        """
+        Exécuté dans le thread principal, que la tâche ait réussi, échoué ou été annulée.
+        """
+        self.layer_manager.cleanup()
+
+
+class KMLTask(AnalysisTask):
+    """Export KML en tâche de fond."""
+
+    def __init__(self, layer, settings, analysis_id, analysis_label, output_dir):
+        super().__init__(f"[Abei GIS] KML - {analysis_label}")
+        # Couches et sources résolues dans le thread principal
+        self.layers = LayerManager.resolve_layers(settings.layers, layer)
+        self.settings = settings
+        self.analysis_id = analysis_id
+        self.analysis_label = analysis_label
+        self.output_dir = output_dir
+        self.tracer = Tracer(f"KML {analysis_label} (id {analysis_id})")
+
+    def _execute(self):
+        return run_kml_job(self.layers, self.settings, self.analysis_id, self.analysis_label,
+                           self.output_dir, feedback=self, tracer=self.tracer)
+
+
+class ExportAllTask(ReportTask):
+    """Rapport Word et export KML en tâche de fond, avec une seule lecture des restrictions."""
+
+    def __init__(self, layer_manager, output_dir, warmup=None):
+        super().__init__(layer_manager, output_dir,
+                         description=f"[Abei GIS] Report + KML - {layer_manager.analysis_label}",
+                         warmup=warmup)
+
+    def _execute(self):
+        self._prepare()
+        report_path, _ = run_all_job(self.layer_manager, self.output_dir, feedback=self, base_cache=self.base_cache)
+        return report_path
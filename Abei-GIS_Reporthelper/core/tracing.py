@@ -0,0 +1,142 @@
+from ..imports import *
+from ..config import Config
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+class Tracer:
+    """
+    Mesure des étapes d'un traitement (intervalles nommés, avec compteurs).
+
+    Chaque intervalle enregistre sa durée, son thread et des compteurs libres
+    (entités, octets, captures...). En fin de traitement (`finish`), un résumé par
+    étape est journalisé et, si `PERF_TRACE.trace_file` est activé, une trace au
+    format Chrome (chrome://tracing, Perfetto) est écrite à côté du résultat.
+
+    Utilisable depuis plusieurs threads (rendus, écritures KML en parallèle).
+    """
+
+    def __init__(self, title):
+        """
+        :param title: Nom du traitement (résumé et trace).
+        """
+        self.title = title
+        self.origin = time.perf_counter()
+        # Tuples (nom, début, fin, thread, compteurs)
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **counts):
+        """
+        Mesure le bloc `with` ; le dictionnaire renvoyé peut recevoir des compteurs.
+
+        :param name: Nom de l'étape (les intervalles de même nom sont cumulés dans le résumé).
+        :param counts: Compteurs initiaux (nombres).
+        """
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add(name, start, time.perf_counter(), **counts)
+
+    def add(self, name, start, end, **counts):
+        """
+        Enregistre un intervalle mesuré ailleurs (instants `time.perf_counter()`).
+        """
+        with self._lock:
+            self.spans.append((name, start, end, threading.get_ident(), counts))
+
+    def summary(self):
+        """
+        Cumul par étape, dans l'ordre de première apparition.
+
+        :return: Dictionnaire {nom: {'count', 'total', 'max', 'counts': {compteur: somme}}}.
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        steps = {}
+        for name, start, end, _, counts in spans:
+            step = steps.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0, 'counts': {}})
+            duration = end - start
+            step['count'] += 1
+            step['total'] += duration
+            step['max'] = max(step['max'], duration)
+            for key, value in counts.items():
+                if isinstance(value, (int, float)):
+                    step['counts'][key] = step['counts'].get(key, 0) + value
+        return steps
+
+    def summary_text(self):
+        """Résumé lisible : une ligne par étape."""
+        lines = [f"Performance - {self.title} ({time.perf_counter() - self.origin:.2f} s)"]
+        for name, step in self.summary().items():
+            line = f"  {name}: {step['count']} x, {step['total']:.3f} s"
+            if step['count'] > 1:
+                line += f" (max {step['max']:.3f} s)"
+            if step['counts']:
+                line += " - " + ", ".join(f"{key}={value}" for key, value in step['counts'].items())
+            lines.append(line)
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """
+        Trace au format Chrome (événements complets « X », temps en microsecondes).
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        pid = os.getpid()
+        events = [{
+            'name': name,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6),
+            'dur': round((end - start) * 1e6),
+            'pid': pid,
+            'tid': thread_id,
+            'args': counts,
+        } for name, start, end, thread_id, counts in spans]
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.title}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+    @staticmethod
+    def trace_path(output_path):
+        """
+        Chemin de la trace à côté d'un résultat : `rapport.docx` -> `rapport.trace.json`,
+        répertoire KML -> `répertoire.trace.json`.
+        """
+        output_path = output_path.rstrip("/\\")
+        if not os.path.isdir(output_path):
+            output_path = os.path.splitext(output_path)[0]
+        return f"{output_path}.trace.json"
+
+    def finish(self, output_path=None):
+        """
+        Journalise le résumé et écrit la trace selon `PERF_TRACE`.
+
+        :param output_path: Résultat du traitement (None en cas d'échec : résumé seulement).
+        :return: Chemin de la trace écrite, ou None.
+        """
+        if not self.spans:
+            return None
+
+        options = Config.PERF_TRACE
+        if options.get('summary', True):
+            QgsMessageLog.logMessage(self.summary_text(), "ABEI GIS", Qgis.Info)
+
+        if not (output_path and options.get('trace_file', False)):
+            return None
+        path = self.trace_path(output_path)
+        try:
+            self.write_chrome_trace(path)
+        except OSError as e:
+            QgsMessageLog.logMessage(f"Performance trace not written: {str(e)}", "ABEI GIS", Qgis.Warning)
+            return None
+        return path
@@ -2,21 +2,30 @@ import os
 import sys
 import re
 import tempfile
-from collections import defaultdict
+import hashlib
+from io import BytesIO
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 
 from qgis.core import (
     QgsProject, QgsFeatureRequest, QgsRectangle,
-    QgsMapSettings, QgsMapRendererSequentialJob,
+    QgsMapSettings, QgsMapRendererSequentialJob, QgsMapRendererParallelJob, QgsMapRendererCustomPainterJob,
     QgsMessageLog, Qgis, QgsSettings,
-    QgsFields, QgsField, QgsFeature,
+    QgsFields, QgsField, QgsFeature, QgsGeometry, QgsVectorLayerFeatureSource,
     QgsVectorLayer, QgsVectorFileWriter,
-    QgsCoordinateReferenceSystem, QgsWkbTypes, QgsApplication
+    QgsCoordinateReferenceSystem, QgsWkbTypes, QgsApplication, QgsTask,
+    QgsProcessingProvider, QgsProcessingAlgorithm, QgsProcessingParameterEnum,
+    QgsProcessingParameterString, QgsProcessingParameterFolderDestination,
+    QgsProcessingOutputNumber, QgsProcessingException, QgsFeatureFilterProvider,
+    QgsRenderContext, QgsCoordinateTransform, QgsExpressionContext, QgsExpressionContextUtils, NULL,
+    QgsMapLayerStyle
 )
 from qgis.PyQt.QtCore import (
     QSize, QDateTime, QTranslator,
-    QCoreApplication, QSettings, QVariant, Qt, QUrl  
+    QCoreApplication, QSettings, QVariant, Qt, QUrl, pyqtSignal, pyqtSlot, QObject, QThread,
+    QByteArray, QBuffer, QIODevice
 )
 from qgis.PyQt.QtGui import (
     QIcon, QPixmap, QColor, QImage, QPainter, QFont, QCursor, QDesktopServices  
@@ -27,7 +36,7 @@ from qgis.PyQt.QtWidgets import (
     QListWidget, QAbstractItemView, QHBoxLayout,
     QDockWidget, QWidget, QFrame, QLineEdit, QRadioButton, QTabWidget,
     QDialogButtonBox, QFormLayout, QScrollArea, QGroupBox,
-    QTableWidget, QHeaderView, QTableWidgetItem, QSizePolicy
+    QTableWidget, QHeaderView, QTableWidgetItem, QSizePolicy, QCheckBox
 )
 
 from qgis.utils import iface
@@ -35,15 +44,8 @@ from qgis.gui import QgsMapToolIdentifyFeature, QgsDockWidget
 
 # > pip install python-docx --target=./lib pour faciliter l'install des utilisateurs.
 #  sinon faire "C:\Program Files\QGIS 3.42.0\apps\Python312\python.exe" -m pip install python-docx
+# python-docx n'est pas importé ici : il est chargé par core/report_generator.py,
+# à la première génération de rapport (voir STARTUP_BUDGET_MS)
 lib_path = os.path.join(os.path.dirname(__file__), 'lib')
 if lib_path not in sys.path:
-    sys.path.insert(0, lib_path)
-from docx import Document
-from docx.shared import Inches, Cm, Pt
-from docx.shared import RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.style import WD_STYLE_TYPE
-from docx.enum.section import WD_ORIENT
-from docx.enum.section import WD_SECTION_START
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
\ No newline at end of file
+    sys.path.insert(0, lib_path)
\ No newline at end of file
@@ -19,7 +19,7 @@ class FCReportGeneratorPlugin:
         if icons_path not in sys.path:
             sys.path.insert(0, icons_path)
 
-        locale = QSettings().value('locale/userLocale')[0:2]
+        locale = (QSettings().value('locale/userLocale') or '')[0:2]
         locale_path = os.path.join(
             self.plugin_dir,
             'i18n',
@@ -32,8 +32,8 @@ class FCReportGeneratorPlugin:
 
         self.actions = []
         self.menu = self.tr('&[Abei GIS] Report helper')
-        self.toolbar = self.iface.addToolBar('[Abei GIS] Report helper')
-        self.toolbar.setObjectName('FCReportGenerator')
+        # Début du chargement (renseigné par classFactory), pour `log_startup`
+        self.startup_started = None
 
     def tr(self, message):
         """
@@ -83,12 +83,66 @@ class FCReportGeneratorPlugin:
         self.actions.append(action)
         return action
 
+    def log_startup(self):
+        """
+        Journalise le temps de chargement du plugin (import, initialisation et
+        interface) et le compare au budget `STARTUP_BUDGET_MS`.
+
+        Signale aussi un chargement anticipé de python-docx, qui ne doit être
+        importé qu'à la première génération de rapport.
+        """
+        if self.startup_started is None:
+            return
+        import time
+        from .config import Config
+
+        elapsed_ms = (time.perf_counter() - self.startup_started) * 1000
+        self.startup_started = None
+        budget_ms = Config.STARTUP_BUDGET_MS
+        message = f"Startup: {elapsed_ms:.0f} ms (budget {budget_ms} ms)"
+        level = Qgis.Info
+        if elapsed_ms > budget_ms:
+            message += " - over budget"
+            level = Qgis.Warning
+        if 'docx' in sys.modules:
+            message += " - python-docx loaded at startup"
+            level = Qgis.Warning
+        QgsMessageLog.logMessage(message, "ABEI GIS", level)
+
+    def initProcessing(self, log_startup=True):
+        """
+        Enregistre le fournisseur Processing (algorithmes utilisables sans interface,
+        y compris avec `qgis_process`).
+
+        :param log_startup: Journalise le temps de chargement (faux quand appelé par `initGui`,
+                            qui le journalise une fois l'interface en place).
+        """
+        from .processing.provider import ReportHelperProvider
+        from .core.layer_registry import LayerRegistry
+
+        # Registre des couches créé ici, dans le thread principal (avec ou sans interface)
+        LayerRegistry.instance()
+
+        self.provider = ReportHelperProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
+        if log_startup:
+            self.log_startup()
+
     def initGui(self):
         """
         Initialise l’interface graphique du plugin.
 
+        - Enregistre le fournisseur Processing
         - Ajoute l'action dans la barre d'outils et le menu
         """
+        self.initProcessing(log_startup=False)
+
+        # Barre d'outils créée ici et non dans __init__ : sans interface
+        # (qgis_process), seul initProcessing est appelé
+        self.toolbar = self.iface.addToolBar('[Abei GIS] Report helper')
+        self.toolbar.setObjectName('FCReportGenerator')
+
         icon_path = os.path.join(os.path.dirname(__file__), 'icons', 'icon.png')
         self.add_action(
             icon_path,
@@ -96,6 +150,8 @@ class FCReportGeneratorPlugin:
             callback=self.run,
             parent=self.iface.mainWindow())
 
+        self.log_startup()
+
     def unload(self):
         """
         Supprime l’interface graphique du plugin.
@@ -114,10 +170,17 @@ class FCReportGeneratorPlugin:
             self.dock_widget.deleteLater()
             del self.dock_widget
 
+        if hasattr(self, 'provider'):
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+            del self.provider
+
         if hasattr(self, 'translator'):
             QCoreApplication.removeTranslator(self.translator)
             del self.translator
 
+        from .core.layer_registry import LayerRegistry
+        LayerRegistry.release()
+
         if hasattr(self, 'toolbar'):
             del self.toolbar
 
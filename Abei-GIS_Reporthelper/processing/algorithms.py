@@ -0,0 +1,195 @@
+from ..imports import *
+from ..config import Config
+
+class ProcessingJobFeedback:
+    """
+    Adapte un `QgsProcessingFeedback` à l'interface de progression des jobs
+    (`set_stage` / `check_canceled`).
+    """
+
+    def __init__(self, feedback):
+        self.feedback = feedback
+
+    def set_stage(self, message, done=None, total=None):
+        if done is not None and total:
+            message = f"{message} {done}/{total}"
+        self.feedback.setProgressText(message)
+
+    def check_canceled(self):
+        from ..core.jobs import JobCanceledError
+        if self.feedback.isCanceled():
+            raise JobCanceledError()
+
+
+class AnalysisAlgorithm(QgsProcessingAlgorithm):
+    """
+    Base commune des algorithmes : mode (FC/DC), technologie, identifiants
+    d'analyses et répertoire de sortie. Chaque analyse est traitée à la suite,
+    une erreur sur l'une n'interrompt pas les suivantes.
+    """
+
+    MODE = 'MODE'
+    TECHNOLOGY = 'TECHNOLOGY'
+    ANALYSIS_IDS = 'ANALYSIS_IDS'
+    OUTPUT_DIR = 'OUTPUT_DIR'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+
+    MODES = ['FC', 'DC']
+
+    def _technologies(self):
+        """Codes des technologies (identiques en FC et DC)."""
+        return list(Config.FC_CONFIG.keys())
+
+    def group(self):
+        return 'Vmap analysis'
+
+    def groupId(self):
+        return 'vmapanalysis'
+
+    def flags(self):
+        # Les couches du projet (règles de rendu des restrictions) sont modifiées pendant le traitement
+        return super().flags() | QgsProcessingAlgorithm.FlagNoThreading
+
+    def createInstance(self):
+        return type(self)()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterEnum(
+            self.MODE, 'Mode', options=['First Check', 'Double Check'], defaultValue=0
+        ))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.TECHNOLOGY, 'Technology',
+            options=[f"{code} - {cfg['technology']}" for code, cfg in Config.FC_CONFIG.items()],
+            defaultValue=0
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            self.ANALYSIS_IDS, 'Analysis IDs (comma separated)'
+        ))
+        self.addParameter(QgsProcessingParameterFolderDestination(
+            self.OUTPUT_DIR, 'Output directory'
+        ))
+        self.addOutput(QgsProcessingOutputNumber(self.SUCCEEDED, 'Succeeded analyses'))
+        self.addOutput(QgsProcessingOutputNumber(self.FAILED, 'Failed analyses'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        from ..core.layer_manager import LayerManager
+        from ..core.batch import collect_analyses
+        from ..core.jobs import JobCanceledError
+
+        mode = self.MODES[self.parameterAsEnum(parameters, self.MODE, context)]
+        technology = self._technologies()[self.parameterAsEnum(parameters, self.TECHNOLOGY, context)]
+        ids = self.parameterAsString(parameters, self.ANALYSIS_IDS, context)
+        output_dir = self.parameterAsString(parameters, self.OUTPUT_DIR, context)
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Mode porté par la configuration figée : le mode du panneau n'est pas modifié
+        try:
+            settings = Config.snapshot(technology, mode)
+            layer = LayerManager.find_area_layer(settings)
+            analyses = collect_analyses(layer, settings, 'ids', ids)
+        except ValueError as e:
+            raise QgsProcessingException(str(e))
+
+        self.prepare(layer, settings)
+        job_feedback = ProcessingJobFeedback(feedback)
+        succeeded = failed = 0
+
+        for i, (analysis_id, analysis_label) in enumerate(analyses):
+            if feedback.isCanceled():
+                break
+            feedback.setProgress(100.0 * i / len(analyses))
+            feedback.pushInfo(f"[{i + 1}/{len(analyses)}] {analysis_label} (id {analysis_id})")
+            try:
+                path = self.run_analysis(layer, settings, analysis_id, analysis_label, output_dir, job_feedback)
+                feedback.pushInfo(f"Written: {path}")
+                succeeded += 1
+            except JobCanceledError:
+                break
+            except Exception as e:
+                feedback.reportError(f"{analysis_label}: {str(e)}")
+                failed += 1
+
+        return {self.OUTPUT_DIR: output_dir, self.SUCCEEDED: succeeded, self.FAILED: failed}
+
+    def prepare(self, layer, settings):
+        """Préparation commune à toutes les analyses du lancement : résolution des couches."""
+        from ..core.layer_manager import LayerManager
+        self._layers = LayerManager.resolve_layers(settings.layers, layer)
+
+    def run_analysis(self, layer, settings, analysis_id, analysis_label, output_dir, feedback):
+        """
+        Traite une analyse.
+
+        :param settings: `ConfigSnapshot` de la technologie.
+
+        :return: Chemin du fichier ou du répertoire produit.
+        """
+        raise NotImplementedError
+
+
+class GenerateReportAlgorithm(AnalysisAlgorithm):
+    """Génère le rapport Word de chaque analyse."""
+
+    def name(self):
+        return 'generatereport'
+
+    def displayName(self):
+        return 'Generate Word report'
+
+    def shortHelpString(self):
+        return ("Generates the Word restrictions report of each analysis ID "
+                "into the output directory.")
+
+    def prepare(self, layer, settings):
+        from ..core.layer_manager import LayerManager
+        super().prepare(layer, settings)
+        LayerManager.enable_all_rules(self._layers['restriction'])
+        LayerManager.capture_styles(self._layers)
+
+    def run_analysis(self, layer, settings, analysis_id, analysis_label, output_dir, feedback):
+        from ..core.layer_manager import LayerManager
+        from ..core.jobs import run_report_job
+
+        layer_manager = LayerManager(
+            layer_name=layer.name(),
+            analysis_id=analysis_id,
+            analysis_label=analysis_label,
+            settings=settings,
+            layers=self._layers
+        )
+        path = None
+        try:
+            layer_manager.setup_layers()
+            path = run_report_job(layer_manager, output_dir, feedback=feedback)
+            return path
+        finally:
+            layer_manager.cleanup()
+            layer_manager.tracer.finish(path)
+
+
+class ExportKmlAlgorithm(AnalysisAlgorithm):
+    """Exporte en KML les zones et restrictions de chaque analyse."""
+
+    def name(self):
+        return 'exportkml'
+
+    def displayName(self):
+        return 'Export KML'
+
+    def shortHelpString(self):
+        return ("Exports the source area, feasible/conditional areas and strict restrictions "
+                "of each analysis ID to KML files in the output directory.")
+
+    def run_analysis(self, layer, settings, analysis_id, analysis_label, output_dir, feedback):
+        from ..core.jobs import run_kml_job
+        from ..core.tracing import Tracer
+
+        tracer = Tracer(f"KML {analysis_label} (id {analysis_id})")
+        path = None
+        try:
+            path = run_kml_job(self._layers, settings, analysis_id, analysis_label, output_dir, feedback=feedback,
+                               tracer=tracer)
+            return path
+        finally:
+            tracer.finish(path)
@@ -0,0 +1,21 @@
+from ..imports import *
+from .algorithms import GenerateReportAlgorithm, ExportKmlAlgorithm
+
+class ReportHelperProvider(QgsProcessingProvider):
+    """
+    Fournisseur Processing du plugin : rend la génération de rapports et l'export KML
+    disponibles dans la boîte à outils et via `qgis_process`, sans interface.
+    """
+
+    def id(self):
+        return 'abeigisreporthelper'
+
+    def name(self):
+        return '[Abei GIS] Report helper'
+
+    def icon(self):
+        return QIcon(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'icons', 'icon.png'))
+
+    def loadAlgorithms(self):
+        self.addAlgorithm(GenerateReportAlgorithm())
+        self.addAlgorithm(ExportKmlAlgorithm())
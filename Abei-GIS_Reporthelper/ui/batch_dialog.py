@@ -0,0 +1,144 @@
+from ..imports import *
+
+class BatchDialog(QDialog):
+    """Boîte de dialogue de paramétrage d'un traitement par lot."""
+
+    def __init__(self, technology_name, selected_count, parent=None):
+        """
+        :param technology_name: Nom de la technologie courante (affichage)
+        :param selected_count: Nombre d'entités sélectionnées sur la couche des zones
+        """
+        super().__init__(parent)
+        self.setWindowTitle(f"Batch generation - {technology_name}")
+        self.setMinimumWidth(450)
+        self._init_ui(selected_count)
+
+    def _init_ui(self, selected_count):
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        # Source des analyses
+        source_group = QGroupBox("Analyses")
+        source_layout = QFormLayout()
+        source_group.setLayout(source_layout)
+
+        self.radio_selection = QRadioButton(f"Current selection ({selected_count})")
+        self.radio_ids = QRadioButton("ID list")
+        self.radio_expression = QRadioButton("Filter expression")
+        self.ids_edit = QLineEdit()
+        self.ids_edit.setPlaceholderText("e.g. 12, 15, 42")
+        self.expression_edit = QLineEdit()
+        self.expression_edit.setPlaceholderText('e.g. "label" LIKE \'%North%\'')
+
+        source_layout.addRow(self.radio_selection)
+        source_layout.addRow(self.radio_ids, self.ids_edit)
+        source_layout.addRow(self.radio_expression, self.expression_edit)
+
+        if selected_count:
+            self.radio_selection.setChecked(True)
+        else:
+            self.radio_selection.setEnabled(False)
+            self.radio_ids.setChecked(True)
+        layout.addWidget(source_group)
+
+        # Sorties
+        output_group = QGroupBox("Outputs")
+        output_layout = QFormLayout()
+        output_group.setLayout(output_layout)
+
+        self.report_check = QCheckBox("Word report")
+        self.report_check.setChecked(True)
+        self.kml_check = QCheckBox("KML")
+        self.kml_check.setChecked(True)
+        output_layout.addRow(self.report_check)
+        output_layout.addRow(self.kml_check)
+
+        dir_layout = QHBoxLayout()
+        self.output_edit = QLineEdit()
+        browse_btn = QPushButton("...")
+        browse_btn.setFixedWidth(32)
+        browse_btn.clicked.connect(self._browse_output)
+        dir_layout.addWidget(self.output_edit)
+        dir_layout.addWidget(browse_btn)
+        output_layout.addRow("Output root:", dir_layout)
+        layout.addWidget(output_group)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self._validate)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def _browse_output(self):
+        output_dir = QFileDialog.getExistingDirectory(self, "Select Output Directory", os.path.expanduser("~"))
+        if output_dir:
+            self.output_edit.setText(output_dir)
+
+    def _validate(self):
+        if not self.output_edit.text():
+            QMessageBox.warning(self, "Batch", "Please select an output directory")
+            return
+        if not (self.report_check.isChecked() or self.kml_check.isChecked()):
+            QMessageBox.warning(self, "Batch", "Please select at least one output")
+            return
+        self.accept()
+
+    def values(self):
+        """
+        :return: Dictionnaire des paramètres saisis (source, value, output_dir, report, kml).
+        """
+        if self.radio_selection.isChecked():
+            source, value = 'selection', None
+        elif self.radio_ids.isChecked():
+            source, value = 'ids', self.ids_edit.text()
+        else:
+            source, value = 'expression', self.expression_edit.text()
+
+        return {
+            'source': source,
+            'value': value,
+            'output_dir': self.output_edit.text(),
+            'report': self.report_check.isChecked(),
+            'kml': self.kml_check.isChecked(),
+        }
+
+
+class BatchSummaryDialog(QDialog):
+    """Tableau récapitulatif d'un traitement par lot : succès, échecs et durées."""
+
+    def __init__(self, results, summary_path=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Batch summary")
+        self.setMinimumSize(700, 400)
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        succeeded = sum(1 for r in results if r.status == "success")
+        failed = sum(1 for r in results if r.status == "failed")
+        total_seconds = sum(r.seconds for r in results)
+        layout.addWidget(QLabel(
+            f"{succeeded} succeeded, {failed} failed, {len(results) - succeeded - failed} canceled "
+            f"- total {total_seconds:.0f} s"
+        ))
+
+        table = QTableWidget(len(results), 5)
+        table.setHorizontalHeaderLabels(["ID", "Label", "Output", "Status", "Time (s)"])
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.verticalHeader().setVisible(False)
+        for row, r in enumerate(results):
+            values = [str(r.analysis_id), str(r.analysis_label), r.kind, r.status, f"{r.seconds:.1f}"]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if r.status != "success":
+                    item.setForeground(QColor("#dc3545"))
+                if r.message:
+                    item.setToolTip(r.message)
+                table.setItem(row, col, item)
+        layout.addWidget(table)
+
+        if summary_path:
+            layout.addWidget(QLabel(f"Summary saved: {summary_path}"))
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
@@ -2,6 +2,7 @@ from ..imports import *
 from ..config import Config
 from .config_window import ConfigEditorDialog
 from ..core.plugin_controller import PluginController
+from ..core.layer_registry import LayerRegistry
 from .stylesheet import STYLESHEET
 
 import os
@@ -23,15 +24,41 @@ class FCReportDock(QDockWidget):
         """
         super().__init__("[ABEI GIS] Report helper", parent)
         self.plugin = plugin
+        # Mode du panneau (FC/DC) : transmis explicitement aux traitements via `current_settings`
+        self.mode = 'FC'
         self.controller = PluginController(self)
 
         self._init_ui()
 
         self.kml_btn.clicked.connect(self.controller.export_to_kml)
-        self.cancel_btn.clicked.connect(self.reset_interface)
+        self.cancel_btn.clicked.connect(self.on_cancel)
         self.ok_btn.clicked.connect(self.controller.generate_report)
+        self.all_btn.clicked.connect(self.controller.export_all)
+        self.batch_btn.clicked.connect(self.controller.run_batch)
         self.technology_combo.currentIndexChanged.connect(self.activate_selected_layer)
         
+    def on_cancel(self):
+        """
+        Annule le traitement en cours s'il y en a un, sinon réinitialise l'interface.
+        """
+        if not self.controller.cancel_task():
+            self.reset_interface()
+
+    def set_busy(self, busy):
+        """
+        Bloque les actions pendant qu'un traitement tourne en tâche de fond.
+        Le bouton Cancel reste actif pour pouvoir l'interrompre.
+        """
+        has_selection = self.selected_analysis is not None
+        self.ok_btn.setEnabled(not busy and has_selection)
+        self.kml_btn.setEnabled(not busy and has_selection)
+        self.all_btn.setEnabled(not busy and has_selection)
+        self.batch_btn.setEnabled(not busy and self.technology_combo.currentData() is not None)
+        self.technology_combo.setEnabled(not busy)
+        self.radio_fc.setEnabled(not busy)
+        self.radio_dc.setEnabled(not busy)
+        self.cancel_btn.setToolTip("Cancel the running task" if busy else "Reset the interface to initial state")
+
     def reset_interface(self):
         """
         Réinitialise l'interface à son état initial.
@@ -46,11 +73,14 @@ class FCReportDock(QDockWidget):
 
         self.ok_btn.setEnabled(False)
         self.kml_btn.setEnabled(False)
+        self.all_btn.setEnabled(False)
+        self.batch_btn.setEnabled(False)
 
         if self.selection_tool:
             iface.mapCanvas().unsetMapTool(self.selection_tool)
             self.selection_tool = None
         
+        self.controller.cancel_warmup()
         self.selected_analysis = None
         self.update_status("Ready - Select a technology and click on an analysis")
 
@@ -108,6 +138,16 @@ class FCReportDock(QDockWidget):
         """)
 
         self.settings_btn.clicked.connect(self.open_config_file)
+
+        # Bouton Vider le cache des captures
+        self.clear_cache_btn = QPushButton()
+        self.clear_cache_btn.setIcon(QgsApplication.getThemeIcon("mActionDeleteSelected.svg"))
+        self.clear_cache_btn.setToolTip("Clear the render cache")
+        self.clear_cache_btn.setFixedSize(28, 28)
+        self.clear_cache_btn.setStyleSheet(self.settings_btn.styleSheet())
+        self.clear_cache_btn.clicked.connect(self.clear_render_cache)
+        header_layout.addWidget(self.clear_cache_btn)
+
         header_layout.addWidget(self.settings_btn)
 
         self.layout.addWidget(header)
@@ -170,6 +210,18 @@ class FCReportDock(QDockWidget):
         self.button_layout.addWidget(self.cancel_btn)
         self.layout.addLayout(self.button_layout)
 
+        self.all_btn = QPushButton("Export all")
+        self.all_btn.setIcon(QIcon.fromTheme("document-save-all"))
+        self.all_btn.setEnabled(False)
+        self.all_btn.setToolTip("Generate the Word report and the KML files of the selected analysis")
+        self.layout.addWidget(self.all_btn)
+
+        self.batch_btn = QPushButton("Batch...")
+        self.batch_btn.setIcon(QgsApplication.getThemeIcon("mActionSelectAll.svg"))
+        self.batch_btn.setEnabled(False)
+        self.batch_btn.setToolTip("Generate reports and KML for several analyses of the selected technology")
+        self.layout.addWidget(self.batch_btn)
+
         self.status_label = QLabel()
         self.status_label.setAlignment(Qt.AlignCenter)
         self.status_label.setStyleSheet("color: #6c757d; font-size: 11px;")
@@ -196,6 +248,7 @@ class FCReportDock(QDockWidget):
         """
         Bascule entre les modes FC et DC et recharge les technologies disponibles.
         """
+        self.mode = mode
         Config.set_mode(mode)
         self.init_technologys()
         self.reset_interface()
@@ -208,14 +261,22 @@ class FCReportDock(QDockWidget):
         self.technology_combo.clear()
         self.technology_combo.addItem("None", None)
 
-        config_dict = Config.FC_CONFIG if Config.CURRENT_MODE == 'FC' else Config.DC_CONFIG
-        for technology, config in config_dict.items():
-            self.technology_combo.addItem(config['technology'], technology)
+        for settings in Config.snapshots(self.mode):
+            self.technology_combo.addItem(settings.technology, settings.tech_code)
 
         self.technology_combo.setCurrentIndex(0)
         self.update_status("Ready - Select a technology and click on an analysis")
 
 
+    def current_settings(self):
+        """
+        Configuration figée du mode et de la technologie sélectionnés.
+
+        :return: `ConfigSnapshot`, ou None si aucune technologie n'est sélectionnée.
+        """
+        technology = self.technology_combo.currentData()
+        return Config.snapshot(technology, self.mode) if technology else None
+
     def activate_selected_layer(self):
         current_index = self.technology_combo.currentIndex()
         if current_index == 0:
@@ -225,30 +286,26 @@ class FCReportDock(QDockWidget):
         if self.selection_tool:
             iface.mapCanvas().unsetMapTool(self.selection_tool)
 
-        technology = self.technology_combo.currentData()
-        if not technology:
+        settings = self.current_settings()
+        if not settings:
             return
+        self.batch_btn.setEnabled(True)
 
-        config = Config.get_config(technology)
-        pattern = config['global_area_layer']
-        
-        QgsMessageLog.logMessage(f"Searching layer with pattern: {pattern}", "Debug")
+        QgsMessageLog.logMessage(f"Searching layer with pattern: {settings.layers['global_area_layer']}", "Debug")
         
-        for layer in QgsProject.instance().mapLayers().values():
-            if re.search(pattern, layer.name()):
-                QgsMessageLog.logMessage(f"Found layer: {layer.name()}", "Debug")
-                QgsMessageLog.logMessage(f"Fields: {[f.name() for f in layer.fields()]}", "Debug")
-                iface.setActiveLayer(layer)
-                self.setup_selection_tool(layer)
-                break
+        layer = LayerRegistry.instance().area_layer(settings)
+        if layer is not None:
+            QgsMessageLog.logMessage(f"Found layer: {layer.name()}", "Debug")
+            QgsMessageLog.logMessage(f"Fields: {[f.name() for f in layer.fields()]}", "Debug")
+            iface.setActiveLayer(layer)
+            self.setup_selection_tool(layer)
 
     def setup_selection_tool(self, layer):
         """
         Configure l'outil de sélection d'entité sur la carte.
         """
         # Vérifie que les champs nécessaires existent
-        id_field = Config.get_id_field()
-        label_field = Config.get_label_field()
+        id_field = self.current_settings().id_field
         
         if id_field not in layer.fields().names():
             self.update_status(f"Error: Field '{id_field}' not found in layer", error=True)
@@ -264,6 +321,8 @@ class FCReportDock(QDockWidget):
         self.selected_object_label.setPlaceholderText("No analysis selected")
         self.ok_btn.setEnabled(False)
         self.kml_btn.setEnabled(False)
+        self.all_btn.setEnabled(False)
+        self.controller.cancel_warmup()
         self.selected_analysis = None
 
     def on_feature_selected(self, feature):
@@ -273,8 +332,9 @@ class FCReportDock(QDockWidget):
             # Debug
             QgsMessageLog.logMessage(f"Selected feature fields: {feature.fields().names()}", "Debug")
             
-            id_field = Config.get_id_field()
-            label_field = Config.get_label_field()
+            settings = self.current_settings()
+            id_field = settings.id_field
+            label_field = settings.label_field
             
             if id_field not in feature.fields().names():
                 raise ValueError(f"ID field '{id_field}' not found in feature")
@@ -288,6 +348,10 @@ class FCReportDock(QDockWidget):
             self.selected_object_label.setText(f"ID: {feature_id} | Name: {label}")
             self.ok_btn.setEnabled(True)
             self.kml_btn.setEnabled(True)
+            self.all_btn.setEnabled(True)
+
+            # Prépare l'analyse en arrière-plan en attendant la génération
+            self.controller.start_warmup(feature)
             
         except Exception as e:
             self.update_status(f"Error: {str(e)}", error=True)
@@ -298,13 +362,29 @@ class FCReportDock(QDockWidget):
         """
         Nettoyage lors de la fermeture du panneau.
 
+        - Annule la tâche et la préparation anticipée en cours
         - Désactive l'outil de sélection s'il est actif
         """
+        self.controller.cancel_task()
+        self.controller.cancel_warmup()
         if self.selection_tool:
             iface.mapCanvas().unsetMapTool(self.selection_tool)
         super().closeEvent(event)
         
 
+    def clear_render_cache(self):
+        """Vide les caches disque des captures et des fonds de carte"""
+        from ..core.render_cache import RenderCache
+
+        try:
+            caches = [RenderCache.from_config(section) for section in ('RENDER_CACHE', 'BASEMAP_CACHE')]
+            freed = sum(cache.clear() for cache in caches if cache is not None)
+            self.update_status(f"Render cache cleared ({freed / (1024 * 1024):.1f} MB)")
+        except Exception as e:
+            error_msg = f"Error clearing render cache: {str(e)}"
+            QgsMessageLog.logMessage(error_msg, "ABEI GIS", Qgis.Warning)
+            self.update_status(error_msg, error=True)
+
     def open_config_file(self):
         """Ouvre l'éditeur de configuration intégré"""
         try: